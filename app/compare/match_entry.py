@@ -3,7 +3,7 @@ import shutil
 
 import pandas as pd
 
-from app.util import excel, prompt
+from app.util import archive, excel, prompt, table
 
 
 def get_new_excel_with_matching_entries(cif_dir_path, script_dir_path):
@@ -13,13 +13,65 @@ def get_new_excel_with_matching_entries(cif_dir_path, script_dir_path):
     cif_ids_in_excel, chosen_sheet_name = excel.load_data_from_excel(
         excel_path
     )
-    cif_ids_in_files, _ = excel.gather_cif_ids_from_files(cif_dir_path)
+    _match(
+        cif_dir_path,
+        excel_path,
+        chosen_sheet_name,
+        cif_ids_in_excel,
+        script_dir_path,
+    )
+
+
+def match_entries(
+    cif_dir_path,
+    table_path,
+    sheet_name=None,
+    output_dir=None,
+    cif_workers=None,
+):
+    """Match the CIF files of a folder or archive against the Entry
+    column of a table without prompting. ``sheet_name`` defaults to the
+    first sheet of a workbook. The filtered table and the report of
+    missing CIF IDs are saved in ``output_dir``, by default the folder
+    of the table. CIF files are read by ``cif_workers`` processes, one
+    per CPU by default."""
+    prompt.print_match_option()
+    cif_ids_in_excel = excel.load_excel_data_to_set(
+        table_path, "Entry", sheet_name
+    )
+    output_dir = output_dir or os.path.dirname(os.path.abspath(table_path))
+    _match(
+        cif_dir_path,
+        table_path,
+        sheet_name,
+        cif_ids_in_excel,
+        output_dir,
+        filtered_dir=output_dir,
+        cif_workers=cif_workers,
+    )
+
+
+def _match(
+    cif_dir_path,
+    excel_path,
+    chosen_sheet_name,
+    cif_ids_in_excel,
+    script_dir_path,
+    filtered_dir=None,
+    cif_workers=None,
+):
+    cif_ids_in_files, _ = excel.gather_cif_ids_from_files(
+        cif_dir_path, workers=cif_workers
+    )
 
     # Filter and save new Excel file
-    filter_excel(excel_path, cif_ids_in_files, chosen_sheet_name)
+    filter_excel(excel_path, cif_ids_in_files, chosen_sheet_name, filtered_dir)
 
     # Move CIF files to subfolders based on match status
-    filter_cif_files(cif_dir_path, cif_ids_in_files, cif_ids_in_excel)
+    if archive.is_cif_archive(cif_dir_path):
+        split_cif_archive(cif_dir_path, cif_ids_in_excel)
+    else:
+        filter_cif_files(cif_dir_path, cif_ids_in_files, cif_ids_in_excel)
 
     # Generate and save report
     generate_and_save_report(
@@ -52,6 +104,16 @@ def filter_cif_files(cif_dir_path, cif_ids_in_files, cif_id_set_from_excel):
     print(f"Unmatched CIF files moved to: {unmatched_dir}")
 
 
+def split_cif_archive(archive_path, cif_id_set_from_excel):
+    """Write matched and unmatched members of a CIF archive into two new
+    archives, leaving the source archive untouched."""
+    matched_path, unmatched_path = archive.split_cif_archive(
+        archive_path, cif_id_set_from_excel
+    )
+    print(f"Matched CIF files written to: {matched_path}")
+    print(f"Unmatched CIF files written to: {unmatched_path}")
+
+
 def generate_and_save_report(
     folder_info,
     cid_id_set_from_excel,
@@ -59,7 +121,7 @@ def generate_and_save_report(
     script_directory,
 ):
     """Generates and saves a report of missing CIF IDs compared."""
-    folder_name = os.path.basename(folder_info)
+    folder_name = archive.get_archive_stem(folder_info)
     cif_id_not_found_list = cid_id_set_from_excel - cif_ids_in_files
 
     if cif_id_not_found_list:
@@ -79,28 +141,34 @@ def generate_and_save_report(
         list(cif_id_not_found_list), columns=["Missing CIF IDs"]
     )
 
-    csv_filename = f"{folder_name}_missing_files.csv"
+    csv_filename = table.output_filename(
+        f"{folder_name}_missing_files", ".csv"
+    )
     csv_path = os.path.join(script_directory, csv_filename)
 
-    df_missing.to_csv(csv_path, index=False)
+    table.write_table(df_missing, csv_path)
     print(f"\nMissing CIF IDs saved to {csv_filename}.")
 
 
-def filter_excel(excel_path, cif_ids_in_files, chosen_sheet_name):
+def filter_excel(
+    excel_path, cif_ids_in_files, chosen_sheet_name, output_dir=None
+):
     """Filters the original Excel sheet to only include the rows the
-    cif_ids_in_files and saves the modified DF to a new Excel file."""
-    df_original = pd.read_excel(excel_path, sheet_name=chosen_sheet_name)
+    cif_ids_in_files and saves the modified DF to a new Excel file in
+    ``output_dir``, by default next to the original."""
+    df_original = table.read_table(excel_path, sheet_name=chosen_sheet_name)
 
     # Filter the dataframe
     df_filtered = df_original[df_original["Entry"].isin(cif_ids_in_files)]
 
     # Create the new filename
     base_name, ext = os.path.splitext(os.path.basename(excel_path))
-    new_filename = base_name + "_filtered" + ext
-    new_excel_path = os.path.join(os.path.dirname(excel_path), new_filename)
+    new_filename = table.output_filename(base_name + "_filtered", ext)
+    output_dir = output_dir or os.path.dirname(excel_path)
+    new_excel_path = os.path.join(output_dir, new_filename)
 
-    # Save to the new Excel file
-    df_filtered.to_excel(new_excel_path, index=False)
+    # Save to the new file
+    table.write_table(df_filtered, new_excel_path)
     print(f"\nFiltered Excel sheet saved to {new_filename}.")
 
     return new_excel_path
@@ -3,7 +3,7 @@ import textwrap
 
 import pandas as pd
 
-from app.util import excel
+from app.util import excel, table
 
 
 def combine_features_with_database_excel(script_dir_path):
@@ -34,27 +34,55 @@ def combine_features_with_database_excel(script_dir_path):
     )
 
 
+def merge_files(
+    featurized_file_path,
+    database_file_path,
+    featurized_sheet_name=None,
+    database_sheet_name=None,
+    output_dir=None,
+):
+    """Merge two tables on their Entry column without prompting. The
+    sheets default to the first sheet of a workbook, and the merged
+    table is saved in ``output_dir``, by default the working folder.
+
+    Returns:
+        str | None: The path of the merged table, None if the tables
+        share no entry.
+    """
+    cif_set_feat = excel.load_excel_data_to_set(
+        featurized_file_path, "Entry", featurized_sheet_name
+    )
+    cif_set_db = excel.load_excel_data_to_set(
+        database_file_path, "Entry", database_sheet_name
+    )
+    common_cif_IDs = cif_set_feat.intersection(cif_set_db)
+    if not common_cif_IDs:
+        print("No common_cif_IDs CIF IDs found.")
+        return None
+    return merge_excel_data(
+        featurized_file_path,
+        featurized_sheet_name,
+        database_file_path,
+        database_sheet_name,
+        common_cif_IDs,
+        output_dir=output_dir,
+    )
+
+
 def merge_excel_data(
     featurized_file_path,
     featurized_sheet_name,
     database_file_path,
     database_sheet_name,
     common_cif_ids,
+    output_dir=None,
 ):
     ext1 = os.path.splitext(featurized_file_path)[1].lower()
     ext2 = os.path.splitext(database_file_path)[1].lower()
 
     # Read inputs
-    if ext1 == ".csv":
-        df1 = pd.read_csv(featurized_file_path)
-    else:
-        df1 = pd.read_excel(
-            featurized_file_path, sheet_name=featurized_sheet_name
-        )
-    if ext2 == ".csv":
-        df2 = pd.read_csv(database_file_path)
-    else:
-        df2 = pd.read_excel(database_file_path, sheet_name=database_sheet_name)
+    df1 = table.read_table(featurized_file_path, featurized_sheet_name)
+    df2 = table.read_table(database_file_path, database_sheet_name)
 
     # Strip whitespace from column names
     df1.columns = df1.columns.str.strip()
@@ -125,13 +153,14 @@ def merge_excel_data(
         0
     ]
     merged_ext = ".csv" if ext1 == ".csv" and ext2 == ".csv" else ".xlsx"
-    out_name = f"{featurized_basename}_{database_basename}_merged{merged_ext}"
-
-    if merged_ext == ".csv":
-        merged.to_csv(out_name, index=False)
-    else:
-        merged.to_excel(out_name, index=False)
+    out_name = table.output_filename(
+        f"{featurized_basename}_{database_basename}_merged", merged_ext
+    )
+    if output_dir is not None:
+        out_name = os.path.join(output_dir, out_name)
+    table.write_table(merged, out_name)
     print(f"Merged data saved to {out_name}")
+    return out_name
 
 
 def print_combine_entry_intro_prompt():
@@ -3,6 +3,9 @@ import os
 import click
 import pandas as pd
 
+from app.filter_util.writer import OutputWriter
+from app.util import table
+
 # 1. Filter formulas based on composition type
 # 2. Remove any elements if needed -> Save:
 #    (1) formulas do not contain the elements
@@ -10,8 +13,19 @@ import pandas as pd
 
 
 def numerical_and_elemental_filtering(
-    filtered_file_path, invalid_formulas_copy
+    filtered_file_path,
+    invalid_formulas_copy,
+    comp_store,
+    filtered_df=None,
+    writer=None,
 ):
+    """Split the filtered entries by System or by excluded elements.
+
+    ``filtered_df`` is the in-memory content of ``filtered_file_path``,
+    which is read back only when it is not given. Outputs go through
+    ``writer``, or are written at once without one.
+    """
+    writer = writer or OutputWriter(eager=True)
     filter_choice = click.prompt(
         "Would you like to filter based on either numerical or elemental "
         "composition? [Y/n]",
@@ -21,42 +35,25 @@ def numerical_and_elemental_filtering(
     if filter_choice.lower() == "y":
         filtering_type = click.prompt(
             "Numerical filtering [1] will separate your sorted dataframe "
-            "based on unary/binary/ternary/quaternary entries, while "
-            "elemental "
+            "based on unary/binary/ternary/quaternary and higher entries, "
+            "while elemental "
             "filtering [2] will remove entries with elements you don't want. "
             "Enter the corresponding number",
             type=int,
         )
 
         if filtering_type == 1:
-            numerical_df = pd.read_excel(filtered_file_path)
-            # Group the DataFrame by the 'System' column and iterate over
-            # the groups
-            for system, group in numerical_df.groupby("System"):
-                # Append system name to the base filename
-                base_name = os.path.splitext(
-                    os.path.basename(filtered_file_path)
-                )[0]
-                file_name = f"{base_name}_{system.lower()}.xlsx"
-                # Get the directory of the input file
-                input_directory = os.path.dirname(filtered_file_path)
-                # Construct the output file path
-                output_file_path = os.path.join(input_directory, file_name)
-                group.to_excel(output_file_path, index=False)
-                click.echo(
-                    f"Entries for {system} saved to: {output_file_path}"
-                )
+            split_by_system(filtered_file_path, filtered_df, writer)
 
         if filtering_type == 2:
-            # Extract unique elements from the DataFrame
-            unique_elements = set()
-            for index, row in invalid_formulas_copy.iterrows():
-                unique_elements.update(row["Elements"])
+            # Extract unique elements from the composition store
+            rows = invalid_formulas_copy.index.to_numpy()
+            unique_elements = set(comp_store.take(rows).unique_symbols())
             while True:
                 elements_to_exclude = click.prompt(
                     "Please input elements to exclude, separated by commas. "
-                    "Available elements: {available_elements}. "
-                    "Enter 'q' to quit.",
+                    f"Available elements: {', '.join(sorted(unique_elements))}"
+                    ". Enter 'q' to quit.",
                     type=str,
                 )
                 if elements_to_exclude.lower() == "q":
@@ -64,68 +61,137 @@ def numerical_and_elemental_filtering(
                 elements_to_exclude = [
                     elem.strip() for elem in elements_to_exclude.split(",")
                 ]
-                # Check if all entered elements are valid
-                if all(
-                    elem in unique_elements for elem in elements_to_exclude
-                ):
-                    elemental_df = invalid_formulas_copy.copy()
-                    filtered_entries = []
-                    removed_entries = []
-                    # Loop through the DataFrame and filter entries
-                    for index, row in elemental_df.iterrows():
-                        # Check if any of the specified elements are present
-                        # in the row
-                        if any(
-                            element in elements_to_exclude
-                            for element in row["Elements"]
-                        ):
-                            removed_entries.append(row)
-                        else:
-                            filtered_entries.append(row)
-
-                    elemental_filtered = pd.DataFrame(filtered_entries)
-                    elemental_removed = pd.DataFrame(removed_entries)
-                    elemental_filtered.reset_index(drop=True, inplace=True)
-                    elemental_removed.reset_index(drop=True, inplace=True)
-                    # Get the directory and base name of the input file
-                    input_directory = os.path.dirname(filtered_file_path)
-                    base_name = os.path.splitext(
-                        os.path.basename(filtered_file_path)
-                    )[0]
-                    # Construct the output file paths
-                    filtered_file = os.path.join(
-                        input_directory,
-                        f"{base_name}_elemental_filtered.xlsx",
+                try:
+                    split_by_elements(
+                        filtered_file_path,
+                        invalid_formulas_copy,
+                        comp_store,
+                        elements_to_exclude,
+                        writer=writer,
                     )
-                    removed_file = os.path.join(
-                        input_directory, f"{base_name}_elemental_removed.xlsx"
-                    )
-                    elemental_filtered.to_excel(filtered_file, index=False)
-                    elemental_removed.to_excel(removed_file, index=False)
-                    click.echo(f"Filtered entries saved to: {filtered_file}")
-                    click.echo(f"Removed entries saved to: {removed_file}")
                     break
-                else:
+                except ValueError:
                     click.echo(
                         "Invalid entry, check the available elements "
                         "list again."
                     )
 
 
-def numerical_classification(invalid_formulas):
-    """Classify formulas based on the number of elements."""
+def split_by_system(filtered_file_path, filtered_df=None, writer=None):
+    """Save the filtered entries of every System, e.g. ``Binary``, next
+    to ``filtered_file_path``, which is read back only when
+    ``filtered_df`` is not given."""
+    writer = writer or OutputWriter(eager=True)
+    if filtered_df is None:
+        filtered_df = table.read_table(filtered_file_path)
+    numerical_df = filtered_df
+    # Group the DataFrame by the 'System' column and iterate over the
+    # groups
+    for system, group in numerical_df.groupby("System", observed=True):
+        # Append system name to the base filename
+        base_name = os.path.splitext(os.path.basename(filtered_file_path))[0]
+        file_name = table.output_filename(f"{base_name}_{system.lower()}")
+        # Get the directory of the input file
+        input_directory = os.path.dirname(filtered_file_path)
+        # Construct the output file path
+        output_file_path = os.path.join(input_directory, file_name)
+        writer.save(
+            group,
+            output_file_path,
+            f"Entries for {system} saved to: {output_file_path}",
+            fg=None,
+        )
+
+
+def split_by_elements(
+    filtered_file_path,
+    invalid_formulas_copy,
+    comp_store,
+    elements_to_exclude,
+    writer=None,
+):
+    """Save the entries without any of ``elements_to_exclude`` and the
+    removed ones next to ``filtered_file_path``.
+
+    Raises:
+        ValueError: If an element does not occur in the entries.
+    """
+    writer = writer or OutputWriter(eager=True)
+    rows = invalid_formulas_copy.index.to_numpy()
+    row_store = comp_store.take(rows)
+    unique_elements = set(row_store.unique_symbols())
+    unknown = [e for e in elements_to_exclude if e not in unique_elements]
+    if unknown:
+        raise ValueError(
+            f"{', '.join(unknown)} not found in the entries. Available "
+            f"elements: {', '.join(sorted(unique_elements))}"
+        )
+    elemental_df = comp_store.attach_list_columns(invalid_formulas_copy)
+    # Bitmask query of the rows without any of the elements
+    is_kept = row_store.excludes(elements_to_exclude)
+    elemental_filtered = elemental_df[is_kept]
+    elemental_removed = elemental_df[~is_kept]
+    # Get the directory and base name of the input file
+    input_directory = os.path.dirname(filtered_file_path)
+    base_name = os.path.splitext(os.path.basename(filtered_file_path))[0]
+    # Construct the output file paths
+    filtered_file = os.path.join(
+        input_directory,
+        table.output_filename(f"{base_name}_elemental_filtered"),
+    )
+    removed_file = os.path.join(
+        input_directory,
+        table.output_filename(f"{base_name}_elemental_removed"),
+    )
+    writer.save(
+        elemental_filtered,
+        filtered_file,
+        f"Filtered entries saved to: {filtered_file}",
+        fg=None,
+    )
+    writer.save(
+        elemental_removed,
+        removed_file,
+        f"Removed entries saved to: {removed_file}",
+        fg=None,
+    )
+
+
+SYSTEM_NAMES = [
+    "Unary",
+    "Binary",
+    "Ternary",
+    "Quaternary",
+    "Quinary",
+    "Senary",
+    "Septenary",
+    "Octonary",
+    "Nonary",
+    "Denary",
+]
+
+
+def get_system_name(num_elements):
+    """Return the system name of a number of elements, e.g. "Quinary"
+    for 5 and "11-ary" beyond the named systems."""
+    if num_elements <= len(SYSTEM_NAMES):
+        return SYSTEM_NAMES[num_elements - 1]
+    return f"{num_elements}-ary"
+
+
+def numerical_classification(invalid_formulas, comp_store):
+    """Classify formulas based on the number of elements.
+
+    The ``System`` column is categorical; formulas without any parsed
+    element are left empty.
+    """
 
     click.secho("Classifying your dataframe", fg="cyan")
-    invalid_formulas_copy = invalid_formulas.copy()
-    invalid_formulas_copy["System"] = None
-    for index, row in invalid_formulas_copy.iterrows():
-        num_elements = len(row["Elements"])
-        if num_elements == 1:
-            invalid_formulas_copy.loc[index, "System"] = "Unary"
-        elif num_elements == 2:
-            invalid_formulas_copy.loc[index, "System"] = "Binary"
-        elif num_elements == 3:
-            invalid_formulas_copy.loc[index, "System"] = "Ternary"
-        elif num_elements == 4:
-            invalid_formulas_copy.loc[index, "System"] = "Quaternary"
-    return invalid_formulas_copy
+    num_elements = comp_store.num_elements[invalid_formulas.index.to_numpy()]
+    max_elements = int(num_elements.max(initial=0))
+    system = pd.Categorical.from_codes(
+        num_elements - 1,
+        categories=[get_system_name(n) for n in range(1, max_elements + 1)],
+        ordered=True,
+    )
+    return invalid_formulas.assign(System=system)
@@ -1,12 +1,16 @@
-from app.filter_util.data import get_element_list
+import re
+from collections import namedtuple
+from itertools import islice
+
+import numpy as np
+import pandas as pd
 
-elements = get_element_list()
+from app.filter_util.data import get_element_list
+from app.util import dedupe
+from app.util.formula_cache import cached_formula_parser, get_formula_cache
 
-invalid_symbols = [
-    char
-    for char in set("".join(elements))
-    if char.isalpha() and char.upper() not in elements and char != "."
-]
+# Hashed element table for O(1) symbol lookups
+elements = frozenset(get_element_list())
 
 
 def parse_formula2(formula):
@@ -36,9 +40,6 @@ def parse_formula2(formula):
                 current_element = char
         elif char.islower():  # if character is lowercase letter
             current_element += char
-        elif char in invalid_symbols:  # if character is an invalid symbol
-            error = f"'{char}' is not a valid symbol"
-            break
         elif char == ".":  # Skip the '.' character
             continue
         else:  # if character is not recognized
@@ -85,3 +86,363 @@ def parse_formula1(formula):
             else 1
         )
     return elements_list, counts_list
+
+
+# Error codes of the long-format composition table
+FORMULA_OK = 0
+INVALID_ELEMENT = 1
+INVALID_SYMBOL = 2
+INVALID_COUNT = 3
+EMPTY_FORMULA = 4
+
+FORMULA_TOKEN_PATTERN = re.compile(
+    r"(?P<element>[A-Z][a-z]*)(?P<count>[\d.]*)|(?P<symbol>[^A-Z])"
+)
+
+# parse_formula2 accepted a count and a lowercase symbol in the first
+# token, reading "2Fe" as Fe2 and "fe2O3" as Fe2O3
+LEADING_TOKEN_PATTERN = re.compile(r"^([\d.]*)([A-Z][a-z]*|[a-z]+)([\d.]*)")
+NEEDS_LEADING_FIX = r"[\d.]+[A-Za-z]|[a-z]"
+
+LONG_COLUMNS = ["row", "position", "element", "count", "error", "offset"]
+
+# Single-pass scanner of tokenize_formula. findall yields one
+# (element, count, other character, count) tuple per token.
+FORMULA_SCANNER = re.compile(r"([A-Z][a-z]*)([\d./]*)|([^A-Z])([\d./]*)")
+LEADING_COUNT = re.compile(r"[\d./]*")
+GROUP_BRACKETS = {"(": ")", "[": "]", "{": "}"}
+HYDRATE_SEPARATORS = frozenset("·•*")
+
+ParsedFormula = namedtuple(
+    "ParsedFormula", ["elements", "counts", "error", "position", "token"]
+)
+
+
+class _TokenError(Exception):
+    """Error at the ``index``-th scanner token, ``group`` being the
+    scanner group holding the offending text."""
+
+    def __init__(self, error, index, group, token):
+        super().__init__(error, index, group, token)
+        self.error = error
+        self.index = index
+        self.group = group
+        self.token = token
+
+    def get_position(self, formula, start):
+        """Return the character position of the error in the formula."""
+        if self.index < 0:
+            return 0
+        matches = FORMULA_SCANNER.finditer(formula, start)
+        return next(islice(matches, self.index, None)).start(self.group)
+
+
+def _to_count(text, index, group):
+    """Convert a decimal or fractional count, 1 if absent."""
+    try:
+        return float(text) if text else 1.0
+    except ValueError:
+        if text == ".":
+            return 1.0
+    numerator, _, denominator = text.partition("/")
+    if numerator.isdigit() and denominator.isdigit() and int(denominator):
+        return int(numerator) / int(denominator)
+    raise _TokenError(INVALID_COUNT, index, group, text)
+
+
+def _merge(target, counts, multiplier):
+    for element, count in counts.items():
+        target[element] = target.get(element, 0.0) + count * multiplier
+
+
+@cached_formula_parser
+def tokenize_formula(formula):
+    """Parse a formula in a single pass over its tokens.
+
+    Besides plain ``ElementCount`` tokens, nested ``()``/``[]``/``{}``
+    groups with a count, decimal (``Co0.5``) and fractional (``Fe1/3``)
+    counts and hydrates separated by ``·``, ``•`` or ``*`` with an
+    optional leading multiplier (``CuSO4·5H2O``) are supported. A ``.``
+    is always read as a decimal point. Repeated elements are summed in
+    order of first appearance.
+
+    Returns:
+        ParsedFormula: ``elements`` and ``counts`` tuples, the ``error``
+        code, and the character ``position`` and ``token`` of the first
+        error (-1 and None if the formula is valid). On error, the
+        elements parsed before it are returned.
+    """
+    if not formula:
+        return ParsedFormula((), (), EMPTY_FORMULA, 0, "")
+    total = {}
+    # Stack of open groups as (element counts, closing bracket, index)
+    stack = [({}, None, -1)]
+    counts = stack[0][0]
+    multiplier = 1.0
+    start = LEADING_COUNT.match(formula).end()
+    try:
+        if start:
+            multiplier = _to_count(formula[:start], -1, 0)
+        tokens = FORMULA_SCANNER.findall(formula, start)
+        for index, (symbol, text, char, char_text) in enumerate(tokens):
+            if symbol:
+                if symbol not in elements:
+                    raise _TokenError(INVALID_ELEMENT, index, 1, symbol)
+                count = _to_count(text, index, 2) if text else 1.0
+                counts[symbol] = counts.get(symbol, 0.0) + count
+            elif char == stack[-1][1]:
+                group_counts = stack.pop()[0]
+                counts = stack[-1][0]
+                _merge(counts, group_counts, _to_count(char_text, index, 4))
+            elif char in HYDRATE_SEPARATORS and len(stack) == 1:
+                _merge(total, counts, multiplier)
+                counts.clear()
+                multiplier = _to_count(char_text, index, 4)
+            elif char in GROUP_BRACKETS and not char_text:
+                counts = {}
+                stack.append((counts, GROUP_BRACKETS[char], index))
+            else:
+                raise _TokenError(INVALID_SYMBOL, index, 3, char)
+        if len(stack) > 1:
+            raise _TokenError(INVALID_SYMBOL, stack[-1][2], 3, None)
+    except _TokenError as exc:
+        _merge(total, stack[0][0], multiplier)
+        position = exc.get_position(formula, start)
+        return ParsedFormula(
+            tuple(total),
+            tuple(total.values()),
+            exc.error,
+            position,
+            formula[position] if exc.token is None else exc.token,
+        )
+    if total or multiplier != 1.0:
+        _merge(total, counts, multiplier)
+    else:
+        total = counts
+    return ParsedFormula(
+        tuple(total), tuple(total.values()), FORMULA_OK, -1, None
+    )
+
+
+def parse_formula_column(formulas, verbose=False, tokenize=False):
+    """Tokenize a whole column of formulas at once.
+
+    Each unique formula is tokenized once and its tokens are broadcast
+    to every row repeating it.
+
+    Args:
+        formulas (pd.Series | list): Formula strings; missing values are
+            treated as empty formulas.
+        verbose (bool): Print the unique-to-total ratio of the formulas.
+        tokenize (bool): Parse the formulas the regex pass flags, or
+            that repeat an element, again with tokenize_formula. This
+            reads groups, hydrates and fractions, but sums repeated
+            elements and drops the tokens after an error, which changes
+            the System and ``Element i`` columns of those formulas. By
+            default every token is kept as parse_formula1 and
+            parse_formula2 read them.
+
+    Returns:
+        pd.DataFrame: Long table with one row per token and the columns
+        ``row`` (position of the formula in the input), ``position``
+        (token index within the formula), ``element`` (symbol, or the
+        offending character for INVALID_SYMBOL), ``count`` (float, NaN
+        for symbols and invalid counts), ``error`` (one of the error
+        codes above) and ``offset`` (character position of an error
+        token, -1 otherwise).
+    """
+    formulas = pd.Series(formulas, dtype=object).reset_index(drop=True)
+    formulas = formulas.where(formulas.notna(), "").astype(str)
+    unique = dedupe.UniqueValues(formulas)
+    if verbose:
+        unique.report()
+    long_df = _tokenize_formulas(
+        pd.Series(unique.uniques).astype(str), tokenize
+    )
+    if verbose and tokenize:
+        get_formula_cache().report()
+    if unique.num_unique == len(unique):
+        return long_df
+    return _broadcast_rows(long_df, unique.codes)
+
+
+def _broadcast_rows(long_df, codes):
+    """Repeat the tokens of the unique formulas for every row, ``codes``
+    giving the unique formula of each row."""
+    sizes = np.bincount(long_df["row"])
+    starts = np.cumsum(sizes) - sizes
+    row_sizes = sizes[codes]
+    new_starts = np.cumsum(row_sizes) - row_sizes
+    positions = np.repeat(starts[codes] - new_starts, row_sizes) + np.arange(
+        row_sizes.sum()
+    )
+    long_df = long_df.iloc[positions].reset_index(drop=True)
+    long_df["row"] = np.repeat(np.arange(len(codes)), row_sizes)
+    return long_df
+
+
+def _fix_leading_tokens(formulas):
+    """Rewrite the first token of the formulas starting with a count or
+    a lowercase symbol the way parse_formula2 read it, e.g. "2Fe3" as
+    "Fe23"."""
+    needs_fix = formulas.str.match(NEEDS_LEADING_FIX)
+    if not needs_fix.any():
+        return formulas
+    fixed = formulas[needs_fix].str.replace(
+        LEADING_TOKEN_PATTERN,
+        lambda m: m[2].capitalize() + m[1] + m[3],
+        regex=True,
+    )
+    return formulas.mask(needs_fix, fixed)
+
+
+def _tokenize_formulas(formulas, tokenize=False):
+    """Build the long table of a Series of formula strings."""
+    tokens = _fix_leading_tokens(formulas).str.extractall(
+        FORMULA_TOKEN_PATTERN
+    )
+    tokens = tokens.reset_index()
+    tokens = tokens.rename(columns={"level_0": "row", "match": "position"})
+
+    is_symbol = tokens["symbol"].notna()
+    raw_count = tokens["count"].fillna("")
+    count = pd.to_numeric(
+        raw_count.mask(raw_count.isin(["", "."]), "1"), errors="coerce"
+    )
+
+    error = pd.Series(FORMULA_OK, index=tokens.index)
+    error[~is_symbol & count.isna()] = INVALID_COUNT
+    error[~is_symbol & ~tokens["element"].isin(elements)] = INVALID_ELEMENT
+    error[is_symbol] = INVALID_SYMBOL
+
+    long_df = pd.DataFrame(
+        {
+            "row": tokens["row"].astype("int64"),
+            "position": tokens["position"].astype("int64"),
+            "element": tokens["element"].where(~is_symbol, tokens["symbol"]),
+            "count": count.where(~is_symbol).astype("float64"),
+            "error": error.astype("int8"),
+            "offset": -1,
+        }
+    )
+
+    # Formulas without any token are reported as empty
+    empty_rows = formulas.index.difference(long_df["row"])
+    if len(empty_rows):
+        empty_df = pd.DataFrame(
+            {
+                "row": empty_rows.astype("int64"),
+                "position": 0,
+                "element": None,
+                "count": float("nan"),
+                "error": EMPTY_FORMULA,
+                "offset": 0,
+            }
+        ).astype(long_df.dtypes.to_dict())
+        long_df = pd.concat([long_df, empty_df], ignore_index=True)
+        long_df = long_df.sort_values(["row", "position"], kind="stable")
+        long_df = long_df.reset_index(drop=True)
+    if tokenize:
+        long_df = _retokenize_rows(long_df, formulas)
+    return long_df[LONG_COLUMNS]
+
+
+def _retokenize_rows(long_df, formulas):
+    """Re-parse with tokenize_formula the formulas the regex pass cannot
+    handle on its own: those with an error token, which may use groups,
+    hydrates or fractions, and those repeating an element."""
+    needs_tokenizer = (long_df["error"] != FORMULA_OK) | long_df.duplicated(
+        ["row", "element"]
+    )
+    rows = long_df.loc[needs_tokenizer, "row"].unique()
+    if not len(rows):
+        return long_df
+
+    records = []
+    for row in rows:
+        parsed = tokenize_formula(formulas[row])
+        for position, (element, count) in enumerate(
+            zip(parsed.elements, parsed.counts)
+        ):
+            records.append((row, position, element, count, FORMULA_OK, -1))
+        if parsed.error != FORMULA_OK:
+            records.append(
+                (
+                    row,
+                    len(parsed.elements),
+                    parsed.token,
+                    float("nan"),
+                    parsed.error,
+                    parsed.position,
+                )
+            )
+    retokenized = pd.DataFrame.from_records(records, columns=LONG_COLUMNS)
+    long_df = pd.concat(
+        [
+            long_df[~long_df["row"].isin(rows)],
+            retokenized.astype(long_df.dtypes.to_dict()),
+        ],
+        ignore_index=True,
+    )
+    long_df = long_df.sort_values(["row", "position"], kind="stable")
+    return long_df.reset_index(drop=True)
+
+
+def _get_first_errors(long_df):
+    """Return the first error token of every formula that has one."""
+    errors = long_df[long_df["error"] != FORMULA_OK]
+    return errors.drop_duplicates("row").set_index("row")
+
+
+def select_tokens(long_df, stop_at_error):
+    """Return the element tokens used to build the wide and list
+    layouts.
+
+    With ``stop_at_error``, only the valid tokens before the first error
+    of a formula are kept. Otherwise every token that names an element
+    candidate is kept, as parse_formula1 does.
+    """
+    if not stop_at_error:
+        is_element = long_df["error"].isin([FORMULA_OK, INVALID_ELEMENT])
+        return long_df[is_element]
+    first_error = _get_first_errors(long_df)["position"]
+    limit = long_df["row"].map(first_error)
+    keep = (long_df["error"] == FORMULA_OK) & ~(long_df["position"] >= limit)
+    return long_df[keep]
+
+
+def get_error_messages(long_df, num_rows):
+    """Return the error message of every formula, None if valid."""
+    first = _get_first_errors(long_df)
+    token = "'" + first["element"].fillna("").astype(object) + "'"
+    messages = pd.Series(None, index=first.index, dtype=object)
+    code = first["error"]
+    messages[code == INVALID_ELEMENT] = token + " is not a valid element"
+    messages[code == INVALID_SYMBOL] = token + " is not recognized"
+    messages[code == INVALID_COUNT] = token + " has an invalid count"
+    messages[code == EMPTY_FORMULA] = "'' is not a valid element"
+    has_offset = (first["offset"] >= 0) & (code != EMPTY_FORMULA)
+    positions = (first["offset"][has_offset] + 1).astype(str).astype(object)
+    messages[has_offset] += " at character " + positions
+    return messages.reindex(range(num_rows))
+
+
+def to_wide_columns(long_df, num_rows, stop_at_error=False):
+    """Build the ``Element i``/``# Element i`` column pairs from a long
+    composition table.
+
+    Returns:
+        pd.DataFrame: One row per formula, indexed by input position.
+    """
+    tokens = select_tokens(long_df, stop_at_error)
+    tokens = tokens.assign(slot=tokens.groupby("row").cumcount())
+    element_wide = tokens.pivot(index="row", columns="slot", values="element")
+    count_wide = tokens.pivot(index="row", columns="slot", values="count")
+    element_wide = element_wide.reindex(range(num_rows))
+    count_wide = count_wide.reindex(range(num_rows))
+
+    columns = {}
+    for i in element_wide.columns:
+        columns[f"Element {i+1}"] = element_wide[i].astype(object)
+        columns[f"# Element {i+1}"] = count_wide[i].astype("float64")
+    return pd.DataFrame(columns, index=range(num_rows))
@@ -1,17 +1,58 @@
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
 import click
-import matplotlib.patches as patches
 import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.cm import get_cmap
+from matplotlib import colormaps
+from matplotlib.collections import PolyCollection
 from matplotlib.colors import Normalize
 
+from app.filter_util.data import get_element_list
 from data.table_coordinates import (
     get_classic_coordinates,
     get_special_coordinates,
 )
 
+DEFAULT_DPI = 500
+
+# Elements left off the heatmap
+SKIPPED_ELEMENTS = frozenset(
+    {
+        "Fr",
+        "Ra",
+        "Rf",
+        "Db",
+        "Sg",
+        "Bh",
+        "Hs",
+        "Mt",
+        "Ds",
+        "Rg",
+        "Cn",
+        "Nh",
+        "Fl",
+        "Mc",
+        "Lv",
+        "Ts",
+        "Og",
+    }
+)
+
+# Corners of the unit cell around an element's (x, y) coordinates
+CELL_CORNERS = np.array([[-0.5, -0.5], [0.5, -0.5], [0.5, 0.5], [-0.5, 0.5]])
+
+
+@lru_cache(maxsize=1)
+def get_coordinate_arrays():
+    """Return the element symbols of the classic table and the corners
+    of their cells as an ``(n, 4, 2)`` array."""
+    coords = get_classic_coordinates()
+    xy = np.array(list(coords.values()), dtype=float)
+    return tuple(coords), xy[:, None, :] + CELL_CORNERS
+
 
 def make_table_fig():
     """Create a base periodic table figure with empty boxes and element
@@ -30,16 +71,17 @@ def make_table_fig():
 
     fig, ax = plt.subplots(figsize=(x_max - x_min + 2, y_max - y_min + 2))
 
-    for symbol, (x, y) in coords.items():
-        rect = patches.Rectangle(
-            (x - 0.5, y - 0.5),
-            1,
-            1,
-            edgecolor="black",
-            linewidth=1.3,
-            facecolor="none",
+    # Draw every cell border as one collection
+    _, cells = get_coordinate_arrays()
+    ax.add_collection(
+        PolyCollection(
+            cells,
+            edgecolors="black",
+            linewidths=1.3,
+            facecolors="none",
+            joinstyle="miter",
         )
-        ax.add_patch(rect)
+    )
 
     for label, (x, y) in special_coords.items():
         ax.text(x, y, label, ha="center", va="center", fontsize=22)
@@ -57,28 +99,32 @@ def make_heatmap(ax, values: dict[str, float]):
     colorbar."""
     coords = get_classic_coordinates()
     cmap_name = "GnBu"
-    cmap = get_cmap(cmap_name)
+    cmap = colormaps[cmap_name]
 
     vmin = min(values.values())
     vmax = max(values.values())
     norm = Normalize(vmin=vmin, vmax=vmax)
 
-    # color each element
-    for symbol, val in values.items():
-        if symbol not in coords:
-            continue
+    # color every element with a nonzero count as one collection
+    symbols, cells = get_coordinate_arrays()
+    row = {symbol: i for i, symbol in enumerate(symbols)}
+    shown = [(symbol, val) for symbol, val in values.items() if symbol in row]
+    rows = np.array([row[symbol] for symbol, _ in shown], dtype=int)
+    vals = np.array([val for _, val in shown], dtype=float)
+    filled = vals != 0
+    ax.add_collection(
+        PolyCollection(
+            cells[rows[filled]],
+            facecolors=cmap(norm(vals[filled])),
+            edgecolors="none",
+            zorder=0,
+        )
+    )
+
+    for symbol, val in shown:
         x, y = coords[symbol]
         if val == 0:
             # no color for zero counts
-            rect = patches.Rectangle(
-                (x - 0.5, y - 0.5),
-                1,
-                1,
-                facecolor="none",
-                edgecolor="none",
-                zorder=0,
-            )
-            ax.add_patch(rect)
             ax.text(
                 x,
                 y,
@@ -91,17 +137,6 @@ def make_heatmap(ax, values: dict[str, float]):
             )
             continue
 
-        rgba = cmap(norm(val))
-        rect = patches.Rectangle(
-            (x - 0.5, y - 0.5),
-            1,
-            1,
-            facecolor=rgba,
-            edgecolor="none",
-            zorder=0,
-        )
-        ax.add_patch(rect)
-
         # determine text color
         txt_color = "w" if norm(val) > 0.74 else "k"
         ax.text(
@@ -125,45 +160,40 @@ def make_heatmap(ax, values: dict[str, float]):
     cbar.set_label("Element Count", fontsize=25, loc="center")
 
 
+def get_heatmap_values(elem_tracker, log_scale=False):
+    """Return the values shown on the heatmap from a dict of element
+    counts or a 118-length vector in atomic number order."""
+    if isinstance(elem_tracker, np.ndarray):
+        elem_tracker = dict(zip(get_element_list(), elem_tracker.tolist()))
+    values = {}
+    for symbol, count in elem_tracker.items():
+        if symbol in SKIPPED_ELEMENTS:
+            continue
+        if log_scale:
+            count = np.log(count) if count > 0 else 0
+        values[symbol] = count
+    return values
+
+
 def element_prevalence(
     elem_tracker,
     excel_file_path,
     script_path,
     log_scale=False,
     ptable_fig=True,
+    writer=None,
+    dpi=DEFAULT_DPI,
 ):
+    """Save a periodic table heatmap of element counts.
 
+    ``elem_tracker`` maps element symbols to counts, or is a 118-length
+    vector of counts in atomic number order. With an OutputWriter
+    ``writer``, the PNG is handed to it instead of saved at once. Lower
+    ``dpi`` values render much faster.
+    """
     if ptable_fig:
         fig, ax = make_table_fig()
-
-        values = {}
-        skip = {
-            "Fr",
-            "Ra",
-            "Rf",
-            "Db",
-            "Sg",
-            "Bh",
-            "Hs",
-            "Mt",
-            "Ds",
-            "Rg",
-            "Cn",
-            "Nh",
-            "Fl",
-            "Mc",
-            "Lv",
-            "Ts",
-            "Og",
-        }
-        for symbol, count in elem_tracker.items():
-            if symbol in skip:
-                continue
-            if log_scale:
-                count = np.log(count) if count > 0 else 0
-            values[symbol] = count
-
-        make_heatmap(ax, values)
+        make_heatmap(ax, get_heatmap_values(elem_tracker, log_scale))
 
         # remove extension from filename
         base = os.path.basename(os.path.normpath(excel_file_path))
@@ -174,8 +204,151 @@ def element_prevalence(
             else f"{name}.png"
         )
         fig_name = os.path.join(script_path, file_name)
-        plt.savefig(fig_name, format="png", bbox_inches="tight", dpi=500)
-        click.secho(
-            f"Periodic table created successfully in {fig_name}", fg="cyan"
-        )
+        message = f"Periodic table created successfully in {fig_name}"
+        if writer is not None:
+            writer.save_figure(
+                fig,
+                fig_name,
+                message,
+                format="png",
+                bbox_inches="tight",
+                dpi=dpi,
+            )
+            return
+        plt.savefig(fig_name, format="png", bbox_inches="tight", dpi=dpi)
+        click.secho(message, fg="cyan")
         plt.draw()
+
+
+class HeatmapRenderer:
+    """Render many heatmaps on one periodic table figure.
+
+    The table, the cell and label artists and the colorbar are built
+    once. Each ``render`` only swaps the cell colors, the label colors
+    and the colorbar scale before saving, and gives the same image as
+    element_prevalence for the same counts.
+    """
+
+    def __init__(self, dpi=DEFAULT_DPI, log_scale=False):
+        self.dpi = dpi
+        self.log_scale = log_scale
+        self.cmap = colormaps["GnBu"]
+        self.fig, self.ax = make_table_fig()
+        self.symbols = [
+            symbol
+            for symbol in get_element_list()
+            if symbol not in SKIPPED_ELEMENTS
+        ]
+        symbols, cells = get_coordinate_arrays()
+        row = {symbol: i for i, symbol in enumerate(symbols)}
+        self.cells = PolyCollection(
+            cells[[row[symbol] for symbol in self.symbols]],
+            facecolors="none",
+            edgecolors="none",
+            zorder=0,
+        )
+        self.ax.add_collection(self.cells)
+        coords = get_classic_coordinates()
+        self.labels = [
+            self.ax.text(
+                *coords[symbol], symbol, ha="center", va="center", fontsize=25
+            )
+            for symbol in self.symbols
+        ]
+        self.image = self.ax.imshow(
+            np.zeros((1, 100)),
+            extent=[0, 1, 0, 0.1],
+            cmap="GnBu",
+            visible=False,
+        )
+        cax = self.ax.inset_axes((0.19, 0.77, 0.4, 0.02))
+        self.cbar = plt.colorbar(self.image, cax=cax, orientation="horizontal")
+        self.cbar.ax.tick_params(labelsize=22)
+        self.cbar.set_label("Element Count", fontsize=25, loc="center")
+
+    def render(self, elem_tracker, file_path):
+        """Save the heatmap of a dict of element counts or a 118-length
+        vector as a PNG and return its path. Elements missing from the
+        dict are shown like zero counts."""
+        values = get_heatmap_values(elem_tracker, self.log_scale)
+        vals = np.array([values.get(s, 0) for s in self.symbols], float)
+        vmin, vmax = min(values.values()), max(values.values())
+        norm = Normalize(vmin=vmin, vmax=vmax)
+        scaled = norm(vals)
+
+        colors = self.cmap(scaled)
+        colors[vals == 0] = 0  # no color for zero counts
+        self.cells.set_facecolor(colors)
+        for label, val, level in zip(self.labels, vals, scaled):
+            if val == 0:
+                label.set(color="k", alpha=0.5)
+            else:
+                label.set(color="w" if level > 0.74 else "k", alpha=1.0)
+
+        self.image.set_data(np.linspace(vmin, vmax, 100).reshape(1, -1))
+        self.image.set_norm(Normalize(vmin=vmin, vmax=vmax))
+        self.cbar.update_normal(self.image)
+        ticks = sorted(set([int(i) for i in np.linspace(vmin, vmax, 6)]))
+        self.cbar.set_ticks(ticks)
+        self.fig.savefig(
+            file_path, format="png", bbox_inches="tight", dpi=self.dpi
+        )
+        return file_path
+
+    def close(self):
+        plt.close(self.fig)
+
+
+def _use_agg():
+    """Initialize a render worker process with the Agg backend."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _render_batch(jobs, dpi, log_scale):
+    """Render a list of (file path, counts) jobs on one figure."""
+    renderer = HeatmapRenderer(dpi=dpi, log_scale=log_scale)
+    try:
+        return [renderer.render(counts, path) for path, counts in jobs]
+    finally:
+        renderer.close()
+
+
+def render_heatmaps(jobs, workers=1, dpi=DEFAULT_DPI, log_scale=False):
+    """Save one periodic table heatmap per entry of ``jobs``.
+
+    ``jobs`` maps output PNG paths to element counts, as taken by
+    element_prevalence. With ``workers`` above 1, the jobs are split
+    across that many processes rendering with the Agg backend, each on
+    its own base figure. Rendered in this process, the jobs use its
+    current backend.
+
+    Returns:
+        list[str]: The paths of the saved heatmaps, in job order.
+    """
+    jobs = list(jobs.items())
+    if workers <= 1 or len(jobs) <= 1:
+        return _render_batch(jobs, dpi, log_scale)
+    workers = min(workers, len(jobs))
+    batches = [jobs[i::workers] for i in range(workers)]
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_use_agg
+    ) as executor:
+        # Wait for every batch, raising the first error
+        list(
+            executor.map(
+                _render_batch,
+                batches,
+                [dpi] * workers,
+                [log_scale] * workers,
+            )
+        )
+    return [path for path, _ in jobs]
+
+
+def get_group_heatmap_path(directory, base_name, group):
+    """Return the heatmap path of one group of a sheet, e.g. the
+    ``Binary`` System or a structure type, safe to use as a file name."""
+    group = re.sub(r"[^\w.-]+", "_", str(group)).strip("_")
+    return os.path.join(directory, f"{base_name}_{group}_ptable.png")
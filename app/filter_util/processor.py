@@ -1,72 +1,131 @@
 import os
 
 import click
+import numpy as np
 import pandas as pd
 
-from app.util import parser
+from app.filter_util import parser, store
+from app.filter_util.writer import OutputWriter
+from app.util import archive, cif_index, scan, table
 
 
 def get_excel_df(file_path):
-    """Process data from an Excel sheet."""
-    # Read the Excel file into a DataFrame
-    data = pd.read_excel(file_path)
+    """Process data from an Excel sheet or another table file."""
+    # Read the file into a DataFrame
+    data = table.read_table(file_path)
     return data
 
 
-def parse_entry_formula(folder_path):
-    entries = []
-    formulas = []
-    structures = []
-
-    # Loop through the directory and its subdirectories
-    for root, _, files in os.walk(folder_path):
-        for file in files:
-            # Check if the file is a CIF file
-            if file.endswith(".cif"):
-                # Get the full path of the CIF file
-                file_path = os.path.join(root, file)
-                # Get the formula from the CIF file
-                formula = parser.get_formula_from_cif(file_path)
-                entry = parser.get_cif_entry_id(file_path)
-                structure = parser.get_cif_structure(file_path)
-                entries.append(entry)
-                formulas.append(formula)
-                structures.append(structure)
-
-    data = pd.DataFrame(
-        {"Entry": entries, "Formula": formulas, "Structure": structures}
-    )
+def parse_entry_formula(
+    folder_path, workers=1, chunk_size=500, use_index=True
+):
+    """Parse the entry, formula and structure of every CIF file in the
+    folder and its subdirectories.
+
+    Files are read in batches of ``chunk_size`` over ``workers``
+    processes (None uses every CPU); rows keep a deterministic order.
+    With ``use_index``, only files changed since the last run are
+    parsed and unreadable files are reported and skipped. A zip or tar
+    archive is read member by member without extraction.
+    """
+    if archive.is_cif_archive(folder_path):
+        data = archive.scan_cif_archive(
+            folder_path, workers=workers, chunk_size=chunk_size
+        )
+    elif not use_index:
+        data = scan.scan_cif_folder(
+            folder_path, workers=workers, chunk_size=chunk_size
+        )
+    else:
+        index_df = cif_index.load_cif_index(
+            folder_path, workers=workers, chunk_size=chunk_size
+        )
+        errors = index_df[index_df["Error"].notna()]
+        for path, error in zip(errors["Path"], errors["Error"]):
+            click.secho(f"Could not read {path}: {error}", fg="red")
+        data = index_df[index_df["Error"].isna()][list(scan.CIF_COLUMNS)]
+        data = data.reset_index(drop=True)
+    # Keep numeric entry IDs as numbers, as they read back from Excel
+    entries = pd.to_numeric(data["Entry"], errors="coerce")
+    if len(entries) and (entries % 1 == 0).all():
+        data["Entry"] = entries.astype("int64")
     return data
 
 
-def compile_element_counts(df, output_dir_path, excel_file_path):
-    """Compile the total number of elements in the DataFrame."""
-    element_counts = {}
-    for i in range(1, (len(df.columns) // 2) + 1):
-        element_col = f"Element {i}"
-        count_col = f"# Element {i}"
-        if element_col not in df.columns or count_col not in df.columns:
-            continue
-        for _, row in df.iterrows():
-            element = row[element_col]
-            count = row[count_col]
-            if pd.notnull(element) and pd.notnull(count):
-                element_counts[element] = element_counts.get(element, 0) + 1
+def expand_elements_and_counts(df):
+    """Parse the Formula column and append ``Element i``/``# Element i``
+    column pairs.
+
+    The DataFrame can be a single chunk from scan.iter_cif_records, so
+    the expansion also runs inside a streaming pipeline.
+    """
+    # Tokenize the whole column at once and pivot it into column pairs
+    long_df = parser.parse_formula_column(df["Formula"])
+    wide_df = parser.to_wide_columns(long_df, len(df))
+    wide_df.index = df.index
+    return pd.concat([df, wide_df], axis=1)
+
+
+def compile_element_counts(
+    df,
+    output_dir_path,
+    excel_file_path,
+    comp_store=None,
+    weighted=False,
+    writer=None,
+):
+    """Compile the total number of elements in the DataFrame.
+
+    The counts come from ``comp_store`` when given, otherwise from the
+    ``Element i``/``# Element i`` columns of the DataFrame. Elements are
+    counted once per formula, or with ``weighted`` by their
+    stoichiometric counts.
+
+    Returns:
+        np.ndarray: The 118 element totals in atomic number order, as
+        taken by prevalence.element_prevalence.
+    """
+    if comp_store is None:
+        comp_store = store.CompositionStore.from_wide(df)
+    totals = comp_store.element_vector(weighted)
+    if weighted:
+        totals = totals.round(store.COUNT_DECIMALS)
+    present = np.flatnonzero(totals)
 
     df = pd.DataFrame(
-        list(element_counts.items()), columns=["Element", "# Element"]
+        {
+            "Element": store.ELEMENT_SYMBOLS[1:][present],
+            "# Element": totals[present],
+        }
     )
     base_name = os.path.splitext(os.path.basename(excel_file_path))[0]
-    file_name = f"{base_name}_element_count.xlsx"
+    file_name = table.output_filename(f"{base_name}_element_count")
     file_path = os.path.join(output_dir_path, file_name)
 
-    df = df.sort_values(by="# Element", ascending=False)
-    df.to_excel(file_path, index=False)
-    click.secho(f"Element counts saved to: {file_path}", fg="cyan")
+    df = df.sort_values(by="# Element", ascending=False, kind="stable")
+    writer = writer or OutputWriter(eager=True)
+    writer.save(df, file_path, f"Element counts saved to: {file_path}")
     click.secho("Element counting is completed", fg="cyan")
 
     # Print the results to the terminal
-    df.index = df.index + 1
     print(df.head(10).to_string(index=False))
 
-    return df
+    return totals
+
+
+def group_element_counts(df, comp_store, by, weighted=False):
+    """Return the element totals of every group of rows, e.g. per
+    System or Structure.
+
+    The index labels of ``df`` are rows of ``comp_store``, as for the
+    parsed DataFrame of the filter option.
+
+    Returns:
+        dict: Group names mapped to 118-length vectors in atomic number
+        order, as taken by prevalence.render_heatmaps.
+    """
+    labels = df.index.to_numpy()
+    return {
+        group: comp_store.take(labels[positions]).element_vector(weighted)
+        for group, positions in df.groupby(by, observed=True).indices.items()
+    }
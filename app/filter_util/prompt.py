@@ -1,29 +1,33 @@
 import os
 
 import click
-import pandas as pd
 
-from app.filter_util.parser import parse_formula1
-from app.filter_util.processor import parse_entry_formula
+from app.filter_util.processor import (
+    expand_elements_and_counts,
+    parse_entry_formula,
+)
+from app.filter_util.writer import OutputWriter
+from app.util import archive, table, workspace
 
 
-def sort_formulas_in_excel_or_folder(script_dir, available_files):
-    available_folders = [
-        folder
-        for folder in available_files
-        if os.path.isdir(os.path.join(script_dir, folder))
-        and any(
-            file.endswith(".cif")
-            for file in os.listdir(os.path.join(script_dir, folder))
-        )
-    ]
+def sort_formulas_in_excel_or_folder(script_dir, available_files, writer=None):
+    """Parse the formulas of a CIF folder or an Excel sheet into
+    ``Element i``/``# Element i`` columns.
+
+    Returns:
+        tuple[pd.DataFrame, str] | None: The parsed DataFrame and the
+        path of its ``_elements_sorted`` output, which is saved
+        through ``writer`` (at once without one), or None if nothing was
+        parsed.
+    """
+    writer = writer or OutputWriter(eager=True)
+    ws = workspace.get_workspace(script_dir)
+    available_files = set(available_files)
 
-    excel_sheets = [f for f in available_files if f.endswith(".xlsx")]
-    cif_folders = [
-        f
-        for f in available_folders
-        if os.path.isdir(os.path.join(script_dir, f))
-    ]
+    excel_sheets = [f for f in available_files if table.is_table_file(f)]
+    cif_folders = [f for f in ws.dirs_with_ext(".cif") if f in available_files]
+    # CIF archives are parsed in place like folders
+    cif_folders += [f for f in ws.cif_archives() if f in available_files]
 
     if not excel_sheets and not cif_folders:
         click.secho(
@@ -45,7 +49,7 @@ def sort_formulas_in_excel_or_folder(script_dir, available_files):
         for idx, folder in enumerate(cif_folders, start=1):
             click.echo(f"{idx}. {folder}")
         excel_sheets.sort()  # Sort the list alphabetically
-        click.secho("Available .xlsx files:", fg="cyan")
+        click.secho("Available .xlsx/.csv/.parquet/.feather files:", fg="cyan")
         for idx, sheet in enumerate(excel_sheets, start=len(cif_folders) + 1):
             click.echo(f"{idx}. {sheet}")
 
@@ -55,106 +59,12 @@ def sort_formulas_in_excel_or_folder(script_dir, available_files):
 
         if 1 <= choice <= len(cif_folders):
             cif_dir_path = os.path.join(script_dir, cif_folders[choice - 1])
-            df = parse_entry_formula(cif_dir_path)
-            df.index = df.index + 1
-            click.secho("Data processed from CIF folder:", fg="cyan")
-            print(df.head(5))
-            print(df.tail(5))
-
-            # Save raw data to Excel sheet if it is a CIF folder
-            file_name = os.path.basename(cif_dir_path)
-            output_folder = os.path.join(script_dir)
-            os.makedirs(output_folder, exist_ok=True)
-
-            # Parse formulas and append elements and counts to DataFrame
-            click.secho(
-                "Currently processing elements of your sheet",
-                fg="cyan",
-            )
-
-            df_copy = df.copy()
-
-            # Apply the function to each row in the DataFrame
-            df_copy[["Elements", "Counts"]] = (
-                df_copy["Formula"].apply(parse_formula1).apply(pd.Series)
-            )
-
-            # Split the lists into separate columns
-            for i in range(max(map(len, df_copy["Elements"]))):
-                df_copy[f"Element {i+1}"] = df_copy["Elements"].str[i]
-                df_copy[f"# Element {i+1}"] = df_copy["Counts"].apply(
-                    lambda x: x[i] if len(x) > i else None
-                )
-
-            # Drop temporary columns
-            df_copy.drop(["Elements", "Counts"], axis=1, inplace=True)
-
-            click.secho(
-                "Elements and counts appended to DataFrame:",
-                fg="cyan",
-            )
-            print(df_copy.head(5))
-            print(df_copy.tail(5))
-
-            # Save DataFrame to Output folder
-            output_file_name = f"{file_name}_elements_sorted.xlsx"
-            output_file_path = os.path.join(output_folder, output_file_name)
-            df_copy.to_excel(output_file_path, index=False)
-            click.secho(
-                f"Appended DataFrame saved to: {output_file_path}",
-                fg="cyan",
-            )
+            return parse_cif_folder(cif_dir_path, script_dir, writer)
 
         elif len(cif_folders) < choice <= len(cif_folders) + len(excel_sheets):
             sheet_idx = choice - len(cif_folders) - 1
-            file_name = excel_sheets[sheet_idx]
-            file_path = os.path.join(script_dir, file_name)
-            df = pd.read_excel(file_path)
-            click.secho("Data processed from Excel sheet:", fg="cyan")
-            click.echo(df)
-
-            # Parse formulas and append elements and counts to DataFrame
-            click.secho(
-                "Currently processing elements of your sheet",
-                fg="cyan",
-            )
-
-            df_copy = df.copy()
-
-            # Apply the function to each row in the DataFrame
-            df_copy[["Elements", "Counts"]] = (
-                df_copy["Formula"].apply(parse_formula1).apply(pd.Series)
-            )
-
-            # Split the lists into separate columns
-            for i in range(max(map(len, df_copy["Elements"]))):
-                df_copy[f"Element {i+1}"] = df_copy["Elements"].str[i]
-                df_copy[f"# Element {i+1}"] = df_copy["Counts"].apply(
-                    lambda x: x[i] if len(x) > i else None
-                )
-
-            # Drop temporary columns
-            df_copy.drop(["Elements", "Counts"], axis=1, inplace=True)
-            df_copy.index = df_copy.index + 1
-            click.secho(
-                "Elements and counts appended to DataFrame:",
-                fg="cyan",
-            )
-            click.echo(df_copy)
-
-            # Save DataFrame to the same directory as the input Excel sheet
-            output_folder = os.path.dirname(file_path)
-            os.makedirs(output_folder, exist_ok=True)
-
-            output_file_name = (
-                f"{os.path.splitext(file_name)[0]}_elements_sorted.xlsx"
-            )
-            output_file_path = os.path.join(output_folder, output_file_name)
-            df_copy.to_excel(output_file_path, index=False)
-            click.secho(
-                f"Appended DataFrame saved to: {output_file_path}",
-                fg="cyan",
-            )
+            file_path = os.path.join(script_dir, excel_sheets[sheet_idx])
+            return parse_table_file(file_path, writer)
 
         else:
             click.secho("Invalid choice.", fg="red")
@@ -166,6 +76,99 @@ def sort_formulas_in_excel_or_folder(script_dir, available_files):
         click.secho("Invalid choice.", fg="red")
 
 
+def parse_cif_folder(cif_dir_path, output_folder, writer=None, workers=None):
+    """Parse the formulas of a CIF folder or archive and save them as
+    ``<folder>_elements_sorted`` in ``output_folder``. The files are
+    read by ``workers`` processes, one per CPU by default.
+
+    Returns:
+        tuple[pd.DataFrame, str]: The parsed DataFrame and the path of
+        its output.
+    """
+    writer = writer or OutputWriter(eager=True)
+    df = parse_entry_formula(cif_dir_path, workers=workers)
+    df.index = df.index + 1
+    click.secho("Data processed from CIF folder:", fg="cyan")
+    print(df.head(5))
+    print(df.tail(5))
+
+    # Save raw data to Excel sheet if it is a CIF folder
+    file_name = archive.get_archive_stem(cif_dir_path)
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Parse formulas and append elements and counts to DataFrame
+    click.secho(
+        "Currently processing elements of your sheet",
+        fg="cyan",
+    )
+
+    df_copy = expand_elements_and_counts(df)
+
+    click.secho(
+        "Elements and counts appended to DataFrame:",
+        fg="cyan",
+    )
+    print(df_copy.head(5))
+    print(df_copy.tail(5))
+
+    # Save DataFrame to Output folder
+    output_file_name = table.output_filename(f"{file_name}_elements_sorted")
+    output_file_path = os.path.join(output_folder, output_file_name)
+    df_copy = df_copy.reset_index(drop=True)
+    writer.save(
+        df_copy,
+        output_file_path,
+        f"Appended DataFrame saved to: {output_file_path}",
+    )
+    return df_copy, output_file_path
+
+
+def parse_table_file(file_path, writer=None, output_folder=None):
+    """Parse the formulas of a table file and save them as
+    ``<file>_elements_sorted`` in ``output_folder``, by default the
+    folder of the file.
+
+    Returns:
+        tuple[pd.DataFrame, str]: The parsed DataFrame and the path of
+        its output.
+    """
+    writer = writer or OutputWriter(eager=True)
+    df = table.read_table(file_path)
+    click.secho("Data processed from Excel sheet:", fg="cyan")
+    click.echo(df)
+
+    # Parse formulas and append elements and counts to DataFrame
+    click.secho(
+        "Currently processing elements of your sheet",
+        fg="cyan",
+    )
+
+    df_copy = expand_elements_and_counts(df)
+    df_copy.index = df_copy.index + 1
+    click.secho(
+        "Elements and counts appended to DataFrame:",
+        fg="cyan",
+    )
+    click.echo(df_copy)
+
+    # Save DataFrame to the same directory as the input Excel sheet
+    output_folder = output_folder or os.path.dirname(file_path)
+    os.makedirs(output_folder, exist_ok=True)
+
+    file_name = os.path.basename(file_path)
+    output_file_name = table.output_filename(
+        f"{os.path.splitext(file_name)[0]}_elements_sorted"
+    )
+    output_file_path = os.path.join(output_folder, output_file_name)
+    df_copy = df_copy.reset_index(drop=True)
+    writer.save(
+        df_copy,
+        output_file_path,
+        f"Appended DataFrame saved to: {output_file_path}",
+    )
+    return df_copy, output_file_path
+
+
 def dataframe_to_dict(results, elements):
     """Convert DataFrame to dictionary with Element as keys and #
     Element as values.
@@ -179,9 +182,5 @@ def dataframe_to_dict(results, elements):
     """
     # Initialize an empty dictionary with all elements and counts set to 0
     d = {element: 0 for element in elements}
-
-    # Iterate through DataFrame rows and update the counts
-    for index, row in results.iterrows():
-        d[row["Element"]] = row["# Element"]
-
+    d.update(zip(results["Element"], results["# Element"]))
     return d
@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+from app.filter_util import parser
+from app.filter_util.data import get_element_list
+
+# Element ID is the atomic number; 0 marks a symbol that is not an element
+ELEMENT_SYMBOLS = np.array([""] + get_element_list(), dtype=object)
+ELEMENT_IDS = {symbol: i for i, symbol in enumerate(ELEMENT_SYMBOLS) if i}
+
+# Counts are stored as float32, so round them back when writing them out
+COUNT_DECIMALS = 6
+
+# Element presence bitmasks use bit (ID % 64) of word (ID // 64)
+BITMASK_WORDS = 2
+
+
+def get_element_bitmask(symbols):
+    """Return the two-word presence bitmask of element symbols, ignoring
+    symbols that are not elements."""
+    mask = np.zeros(BITMASK_WORDS, dtype=np.uint64)
+    for symbol in symbols:
+        if symbol in ELEMENT_IDS:
+            element_id = ELEMENT_IDS[symbol]
+            mask[element_id // 64] |= np.uint64(1) << np.uint64(
+                element_id % 64
+            )
+    return mask
+
+
+class CompositionStore:
+    """Compact compositions of many formulas in CSR layout.
+
+    Row ``i`` holds the elements ``element_ids[offsets[i]:offsets[i+1]]``
+    with the matching ``counts``. A parsed DataFrame keeps a RangeIndex,
+    so the index labels of any subset of it are its store rows.
+    """
+
+    def __init__(self, element_ids, counts, offsets):
+        self.element_ids = np.asarray(element_ids, dtype=np.int8)
+        self.counts = np.asarray(counts, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self._bitmask = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def num_elements(self):
+        """Number of elements of every row."""
+        return np.diff(self.offsets)
+
+    @property
+    def row_ids(self):
+        """Row number of every stored element."""
+        return np.repeat(np.arange(len(self)), self.num_elements)
+
+    def row(self, i):
+        """Return the element symbols and counts of one row."""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        symbols = ELEMENT_SYMBOLS[self.element_ids[start:end]].tolist()
+        return symbols, self.counts[start:end]
+
+    @classmethod
+    def _from_sizes(cls, element_ids, counts, sizes):
+        offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        return cls(element_ids, counts, offsets)
+
+    @classmethod
+    def from_long(cls, long_df, num_rows, stop_at_error=True):
+        """Build a store from a parser.parse_formula_column table."""
+        tokens = parser.select_tokens(long_df, stop_at_error)
+        element_ids = tokens["element"].map(ELEMENT_IDS).fillna(0)
+        sizes = np.bincount(tokens["row"], minlength=num_rows)
+        return cls._from_sizes(element_ids, tokens["count"], sizes)
+
+    @classmethod
+    def from_lists(cls, element_lists, count_lists):
+        """Build a store from ``Elements``/``Counts`` list columns."""
+        sizes = [len(elements) for elements in element_lists]
+        element_ids = [
+            ELEMENT_IDS.get(symbol, 0)
+            for elements in element_lists
+            for symbol in elements
+        ]
+        counts = [count for counts in count_lists for count in counts]
+        return cls._from_sizes(element_ids, counts, sizes)
+
+    @classmethod
+    def from_wide(cls, df):
+        """Build a store from ``Element i``/``# Element i`` columns.
+
+        Pairs missing either the element or the count are skipped.
+        """
+        pairs = []
+        while f"Element {len(pairs) + 1}" in df.columns:
+            i = len(pairs) + 1
+            if f"# Element {i}" not in df.columns:
+                break
+            pairs.append((f"Element {i}", f"# Element {i}"))
+        if not pairs:
+            return cls._from_sizes([], [], np.zeros(len(df), dtype=np.int64))
+        symbols = df[[e for e, _ in pairs]].to_numpy(dtype=object)
+        counts = df[[c for _, c in pairs]].apply(
+            pd.to_numeric, errors="coerce"
+        )
+        counts = counts.to_numpy(dtype=np.float64)
+        present = pd.notna(symbols) & ~np.isnan(counts)
+        element_ids = pd.Series(symbols[present]).map(ELEMENT_IDS).fillna(0)
+        return cls._from_sizes(
+            element_ids, counts[present], present.sum(axis=1)
+        )
+
+    def take(self, rows):
+        """Return a new store holding the given rows in order."""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        sizes = self.offsets[rows + 1] - starts
+        new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=new_offsets[1:])
+        positions = np.repeat(starts - new_offsets[:-1], sizes) + np.arange(
+            new_offsets[-1]
+        )
+        taken = CompositionStore(
+            self.element_ids[positions], self.counts[positions], new_offsets
+        )
+        if self._bitmask is not None:
+            taken._bitmask = self._bitmask[rows]
+        return taken
+
+    @property
+    def bitmask(self):
+        """128-bit element presence bitmask of every row, as an
+        ``(n, 2)`` uint64 array. Built on first use."""
+        if self._bitmask is None:
+            ids = self.element_ids.astype(np.int64)
+            is_element = ids > 0
+            rows = self.row_ids[is_element]
+            ids = ids[is_element]
+            bits = np.left_shift(np.uint64(1), (ids % 64).astype(np.uint64))
+            bitmask = np.zeros((len(self), BITMASK_WORDS), dtype=np.uint64)
+            for word in range(BITMASK_WORDS):
+                in_word = ids // 64 == word
+                np.bitwise_or.at(
+                    bitmask[:, word], rows[in_word], bits[in_word]
+                )
+            self._bitmask = bitmask
+        return self._bitmask
+
+    def element_counts(self, weighted=False):
+        """Return per-element totals indexed by element ID, counting
+        occurrences or, with ``weighted``, summing the counts."""
+        return np.bincount(
+            self.element_ids,
+            weights=self.counts if weighted else None,
+            minlength=len(ELEMENT_SYMBOLS),
+        )
+
+    def element_vector(self, weighted=False):
+        """Return element_counts as a 118-length vector in atomic number
+        order, without the non-element slot."""
+        return self.element_counts(weighted)[1:]
+
+    def unique_symbols(self):
+        """Return the sorted symbols of the elements in the store."""
+        ids = np.unique(self.element_ids)
+        return ELEMENT_SYMBOLS[ids[ids > 0]].tolist()
+
+    def contains_any(self, symbols):
+        """Return a boolean mask of the rows containing any symbol."""
+        mask = get_element_bitmask(symbols)
+        return (self.bitmask & mask).any(axis=1)
+
+    def contains_all(self, symbols):
+        """Return a boolean mask of the rows containing every symbol."""
+        if not all(symbol in ELEMENT_IDS for symbol in symbols):
+            return np.zeros(len(self), dtype=bool)
+        mask = get_element_bitmask(symbols)
+        return ((self.bitmask & mask) == mask).all(axis=1)
+
+    def excludes(self, symbols):
+        """Return a boolean mask of the rows containing none of the
+        symbols."""
+        return ~self.contains_any(symbols)
+
+    def to_list_columns(self):
+        """Return the ``Elements``/``Counts`` list columns. Integral
+        counts are ints, as parse_formula2 gave them, e.g. ``[1, 2]``,
+        and the others floats."""
+        if not len(self):
+            return pd.DataFrame({"Elements": [], "Counts": []}, dtype=object)
+        splits = self.offsets[1:-1]
+        symbols = np.split(ELEMENT_SYMBOLS[self.element_ids], splits)
+        values = self.counts.astype(np.float64).round(COUNT_DECIMALS)
+        is_integral = values == np.round(values)
+        counts = values.astype(object)
+        counts[is_integral] = values[is_integral].astype(np.int64)
+        counts = np.split(counts, splits)
+        return pd.DataFrame(
+            {
+                "Elements": [row.tolist() for row in symbols],
+                "Counts": [row.tolist() for row in counts],
+            }
+        )
+
+    def to_wide_columns(self):
+        """Return the ``Element i``/``# Element i`` column pairs."""
+        sizes = self.num_elements
+        width = int(sizes.max()) if len(self) else 0
+        slots = np.arange(len(self.element_ids)) - np.repeat(
+            self.offsets[:-1], sizes
+        )
+        symbols = np.full((len(self), width), None, dtype=object)
+        counts = np.full((len(self), width), np.nan)
+        symbols[self.row_ids, slots] = ELEMENT_SYMBOLS[self.element_ids]
+        counts[self.row_ids, slots] = self.counts.astype(np.float64).round(
+            COUNT_DECIMALS
+        )
+        columns = {}
+        for i in range(width):
+            columns[f"Element {i+1}"] = symbols[:, i]
+            columns[f"# Element {i+1}"] = counts[:, i]
+        return pd.DataFrame(columns)
+
+    def attach_list_columns(self, df, before="Error"):
+        """Return a copy of a parsed DataFrame (or subset of it) with the
+        ``Elements``/``Counts`` list columns inserted before a column,
+        replacing those of a sheet summarized before."""
+        lists = self.take(df.index.to_numpy()).to_list_columns()
+        lists.index = df.index
+        df = df.drop(columns=["Elements", "Counts"], errors="ignore")
+        loc = df.columns.get_loc(before) if before in df else len(df.columns)
+        return pd.concat([df.iloc[:, :loc], lists, df.iloc[:, loc:]], axis=1)
@@ -0,0 +1,212 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import click
+import pandas as pd
+
+from app.util import table
+
+DEFAULT_WORKERS = 2
+
+# Excel limits sheet names to 31 characters
+MAX_SHEET_NAME_LENGTH = 31
+
+
+def _write_bytes(file_path, data):
+    with open(file_path, "wb") as f:
+        f.write(data)
+
+
+def _write_workbook(file_path, sheets):
+    """Write DataFrames into the sheets of one workbook opened once."""
+    with pd.ExcelWriter(file_path) as excel_writer:
+        for sheet_name, df in sheets.items():
+            df.to_excel(excel_writer, sheet_name=sheet_name, index=False)
+
+
+class OutputWriter:
+    """Output tables and figures of a filter run.
+
+    Stages hand over finished DataFrames with ``save`` and figures with
+    ``save_figure`` and move on. The DataFrames must not be modified
+    afterwards. Figures are rendered and closed before ``save_figure``
+    returns. By default each output is written in the background by a
+    pool of ``workers`` threads, or processes with ``processes``.
+    ``flush`` waits for the writes, echoes them in the order they were
+    saved and reports the ones that failed. With ``eager``, each output is
+    written before ``save`` returns, as a checkpoint on disk.
+
+    With ``workbook``, tables are instead written by ``flush`` into the
+    sheets of the single workbook set with ``use_workbook``. Figures
+    are still written to their own files.
+
+    Used as a context manager, the writer is flushed and its pool shut
+    down on exit, also when a stage fails. The outputs saved before the
+    failure are then still written, tables to their own files if the
+    workbook was not set yet, and the stage's error is raised.
+    """
+
+    def __init__(
+        self,
+        eager=False,
+        workers=DEFAULT_WORKERS,
+        processes=False,
+        workbook=False,
+    ):
+        self.eager = eager
+        self.workers = workers
+        self.processes = processes
+        self.workbook = workbook
+        self.workbook_path = None
+        self.pending = []
+        self._sheets = {}
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.flush()
+                return
+            # Save what the stages finished without masking their error
+            if self._sheets and self.workbook_path is None:
+                self._save_sheets_as_files()
+            try:
+                self.flush()
+            except Exception as error:
+                click.secho(f"Failed to save the outputs: {error}", fg="red")
+        finally:
+            self.close()
+
+    def _submit(self, func, *args):
+        if self._executor is None:
+            executor_class = (
+                ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+            )
+            self._executor = executor_class(max_workers=self.workers)
+        return self._executor.submit(func, *args)
+
+    def save(self, df, file_path, message, fg="cyan"):
+        """Write ``df`` to ``file_path``, then echo ``message``."""
+        if self.eager:
+            table.write_table(df, file_path)
+            click.secho(message, fg=fg)
+        elif self.workbook:
+            sheet_name = self._get_sheet_name(file_path)
+            self._sheets[sheet_name] = df
+            self.pending.append((None, file_path, sheet_name, fg))
+        else:
+            future = self._submit(table.write_table, df, file_path)
+            self.pending.append((future, file_path, message, fg))
+        return file_path
+
+    def save_figure(self, fig, file_path, message, fg="cyan", **kwargs):
+        """Save a matplotlib figure with ``fig.savefig(file_path,
+        **kwargs)`` and close it, then echo ``message``.
+
+        Pyplot is not thread-safe, so the figure is always rendered on
+        the calling thread. Only writing the rendered file is left to
+        the pool.
+        """
+        import matplotlib.pyplot as plt
+
+        if self.eager:
+            try:
+                fig.savefig(file_path, **kwargs)
+            finally:
+                plt.close(fig)
+            click.secho(message, fg=fg)
+            return file_path
+        kwargs.setdefault("format", table.get_extension(file_path)[1:])
+        buffer = io.BytesIO()
+        try:
+            fig.savefig(buffer, **kwargs)
+        finally:
+            plt.close(fig)
+        future = self._submit(_write_bytes, file_path, buffer.getvalue())
+        self.pending.append((future, file_path, message, fg))
+        return file_path
+
+    def use_workbook(self, file_path):
+        """Set the workbook the tables are written into."""
+        self.workbook_path = file_path
+
+    def _get_sheet_name(self, file_path):
+        """Name a sheet after the part of the file name that follows
+        the workbook name, e.g. ``summary``, unique in the workbook."""
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        if self.workbook_path:
+            base = os.path.splitext(os.path.basename(self.workbook_path))[0]
+            stem = stem.removeprefix(base.removesuffix("_outputs") + "_")
+        sheet_name = stem[:MAX_SHEET_NAME_LENGTH]
+        i = 1
+        while sheet_name in self._sheets:
+            suffix = f"_{i}"
+            sheet_name = stem[: MAX_SHEET_NAME_LENGTH - len(suffix)] + suffix
+            i += 1
+        return sheet_name
+
+    def _save_sheets_as_files(self):
+        """Write the tables queued for the workbook to their own files
+        instead."""
+        sheets, self._sheets = self._sheets, {}
+        pending = []
+        for future, file_path, message, fg in self.pending:
+            if future is None:
+                df = sheets[message]
+                future = self._submit(table.write_table, df, file_path)
+                message = f"Table saved to: {file_path}"
+            pending.append((future, file_path, message, fg))
+        self.pending = pending
+
+    def flush(self, sheets=True):
+        """Wait for every pending output, echo it in the order it was
+        saved and report the ones that failed. With ``sheets`` False,
+        the tables queued for the workbook are kept for a later flush,
+        so the workbook is still written once with all of its sheets.
+
+        Returns:
+            list[tuple[str, Exception]]: The path and error of every
+            output that could not be written.
+        """
+        workbook = None
+        if self._sheets and sheets:
+            if self.workbook_path is None:
+                raise ValueError("No workbook set for the tables.")
+            workbook = self._submit(
+                _write_workbook, self.workbook_path, self._sheets
+            )
+            self._sheets = {}
+        failures = []
+        pending, self.pending = self.pending, []
+        if not sheets:
+            self.pending = [item for item in pending if item[0] is None]
+            pending = [item for item in pending if item[0] is not None]
+        for future, file_path, message, fg in pending:
+            if future is None:
+                # A sheet of the workbook
+                future, file_path = workbook, self.workbook_path
+                message = f"Sheet '{message}' saved to: {file_path}"
+            try:
+                future.result()
+            except Exception as error:
+                failures.append((file_path, error))
+                click.secho(f"Failed to save {file_path}: {error}", fg="red")
+                continue
+            click.secho(message, fg=fg)
+        if failures:
+            click.secho(
+                f"{len(failures)} of {len(pending)} outputs could not be "
+                "saved.",
+                fg="red",
+            )
+        return failures
+
+    def close(self):
+        """Shut down the pool once the running writes finish."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,22 @@
+"""Names of the choices shared by main.py and the runners.
+
+This module imports nothing, so main.py can build its command line
+without pulling in pandas or the runners.
+"""
+
+# Table formats mapped to their file extension
+TABLE_FORMATS = {
+    "xlsx": ".xlsx",
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "csv": ".csv",
+}
+
+# Formats written and read with pyarrow
+ARROW_FORMATS = ("parquet", "feather")
+
+# Methods of app.runners.sort.sort_file
+SORT_METHODS = ("custom", "stoichiometry", "property")
+
+# Ways app.runners.filter.run_filter splits the filtered entries
+SPLIT_METHODS = ("system", "elements")
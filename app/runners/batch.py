@@ -0,0 +1,133 @@
+import importlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+from app.util import table
+
+# Headless function of every job command. They pull in pandas,
+# matplotlib, CAF and bobleesj, so each is imported when its job runs
+JOB_FUNCTIONS = {
+    "filter": ("app.runners.filter", "run_filter"),
+    "sort": ("app.runners.sort", "sort_file"),
+    "feature": ("app.runners.feature", "featurize_file"),
+    "match": ("app.compare.match_entry", "match_entries"),
+    "merge": ("app.compare.merge_entry", "merge_files"),
+}
+
+# Arguments keeping a job in its own process when jobs run in a pool,
+# which already uses every CPU
+SERIAL_ARGUMENTS = {
+    "filter": {"workers": 1, "processes": False, "cif_workers": 1},
+    "match": {"cif_workers": 1},
+}
+
+# Job arguments holding paths, resolved against the manifest folder
+PATH_ARGUMENTS = {
+    "input_path",
+    "file_path",
+    "cif_dir_path",
+    "table_path",
+    "featurized_file_path",
+    "database_file_path",
+    "output_dir",
+}
+
+
+def load_manifest(manifest_path):
+    """Read the jobs of a JSON manifest.
+
+    The manifest is either a list of jobs or an object with a ``jobs``
+    list and an optional ``output_format``. A job names its
+    ``command``, one of JOB_FUNCTIONS, and the keyword arguments of its
+    function, e.g. ``{"command": "sort", "file_path": "formula.xlsx",
+    "method": "stoichiometry"}``. A job may set its own
+    ``output_format``. Relative paths are resolved against the folder
+    of the manifest.
+
+    Returns:
+        tuple[list[dict], str | None]: The jobs and the output format
+        of the manifest.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    for i, job in enumerate(manifest.get("jobs", []), start=1):
+        command = job.get("command")
+        if command not in JOB_FUNCTIONS:
+            raise ValueError(
+                f"Job {i} has an unknown command {command!r}, choose one "
+                f"of {', '.join(JOB_FUNCTIONS)}."
+            )
+        job = dict(job)
+        for key in PATH_ARGUMENTS.intersection(job):
+            if job[key] is not None:
+                job[key] = os.path.join(base_dir, os.path.expanduser(job[key]))
+        jobs.append(job)
+    return jobs, manifest.get("output_format")
+
+
+def run_job(job, output_format=None):
+    """Run one job in this process and return the result of its
+    function."""
+    kwargs = dict(job)
+    module_name, function_name = JOB_FUNCTIONS[kwargs.pop("command")]
+    table.set_output_format(kwargs.pop("output_format", output_format))
+    if kwargs.get("output_dir"):
+        os.makedirs(kwargs["output_dir"], exist_ok=True)
+    function = getattr(importlib.import_module(module_name), function_name)
+    return function(**kwargs)
+
+
+def _run_job_safely(job, output_format):
+    """Run a job and return its error message, None if it succeeded."""
+    try:
+        run_job(job, output_format)
+    except Exception as error:
+        return f"{type(error).__name__}: {error}"
+    return None
+
+
+def run_jobs(jobs, workers=1, output_format=None):
+    """Run every job, in a pool of ``workers`` processes above 1, then
+    report the ones that failed. A failed job does not stop the
+    others. Jobs run in the pool start no processes of their own, see
+    SERIAL_ARGUMENTS.
+
+    Returns:
+        list[tuple[int, str]]: The number and error of every failed job.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        errors = [_run_job_safely(job, output_format) for job in jobs]
+    else:
+        serial_jobs = [
+            {**job, **SERIAL_ARGUMENTS.get(job["command"], {})} for job in jobs
+        ]
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as ex:
+            errors = list(
+                ex.map(
+                    _run_job_safely,
+                    serial_jobs,
+                    [output_format] * len(jobs),
+                )
+            )
+    failures = []
+    for i, (job, error) in enumerate(zip(jobs, errors), start=1):
+        if error is None:
+            click.secho(f"Job {i} ({job['command']}) done", fg="green")
+        else:
+            failures.append((i, error))
+            click.secho(
+                f"Job {i} ({job['command']}) failed: {error}", fg="red"
+            )
+    if failures:
+        click.secho(
+            f"{len(failures)} of {len(jobs)} jobs failed.",
+            fg="red",
+        )
+    return failures
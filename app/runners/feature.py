@@ -1,11 +1,12 @@
 import os
+import tempfile
 import warnings
 
 import click
 import pandas as pd
 from CAF.features import generator
 
-from app.util import folder
+from app.util import dedupe, folder, header, table
 
 """
 Ignore warnings for Pandas
@@ -22,18 +23,6 @@ def run_feature_option(script_dir_path):
         print("No Excel file was found. Exiting.")
         return
 
-    # list Excel files containing with "formula" columns
-    _, base_name = os.path.split(formula_excel_path)
-    base_name_no_ext = os.path.splitext(base_name)[0]
-    df = pd.read_excel(formula_excel_path)
-    try:
-        col = next(c for c in df.columns if c.lower() == "formula")
-    except StopIteration:
-        print("No formula column found. Exiting.")
-        return
-
-    formulas = df[col]
-
     # User select whether to add normalized compositional one-hot encoding
     # is_encoding_added = click.confirm(
     #     "\nDo you want to include normalized composition vector? "
@@ -57,8 +46,62 @@ def run_feature_option(script_dir_path):
         default=False,
     )
 
-    generator.get_composition_features(
-        formulas,
+    featurize_file(
+        formula_excel_path,
         extended_features=add_extended_features,
+        output_dir="./",
+    )
+
+
+def featurize_file(file_path, extended_features=False, output_dir=None):
+    """Save the CAF feature files of the formulas of a table file in
+    ``output_dir``, by default next to the file, without prompting.
+    Returns False when the file has no formula column."""
+    output_dir = output_dir or os.path.dirname(os.path.abspath(file_path))
+    _, base_name = os.path.split(file_path)
+    base_name_no_ext = os.path.splitext(base_name)[0]
+    col = header.find_column(table.get_columns(file_path), "formula")
+    if col is None:
+        print("No formula column found. Exiting.")
+        return False
+
+    # Read only the formula column of the file
+    formulas = table.read_table(file_path, usecols=[col])[col]
+    _get_composition_features(
+        formulas,
+        extended_features=extended_features,
         file_prefix=base_name_no_ext,
+        save_dir=output_dir,
     )
+    return True
+
+
+def _get_composition_features(
+    formulas, extended_features, file_prefix, save_dir="./"
+):
+    """Generate the CAF feature files of the unique formulas only, then
+    expand every file back to one row per input formula."""
+    unique = dedupe.UniqueValues(formulas)
+    unique.report()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        generator.get_composition_features(
+            list(unique.uniques),
+            extended_features=extended_features,
+            save_dir=tmp_dir,
+            file_prefix=file_prefix,
+        )
+        for name in sorted(os.listdir(tmp_dir)):
+            csv_path = os.path.join(tmp_dir, name)
+            df = pd.read_csv(csv_path, float_precision="round_trip")
+            # Read the formulas as text, e.g. "NaN" is a valid formula
+            df["formula"] = pd.read_csv(
+                csv_path, usecols=["formula"], dtype=str, na_filter=False
+            )["formula"]
+            # Row of every unique formula in this file, -1 if absent
+            rows = pd.Index(df["formula"]).get_indexer(unique.uniques)
+            rows = rows[unique.codes]
+            stem = os.path.splitext(name)[0]
+            table.write_table(
+                df.iloc[rows[rows >= 0]],
+                os.path.join(save_dir, table.output_filename(stem, ".csv")),
+            )
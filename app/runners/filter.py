@@ -1,7 +1,6 @@
 import os
 
 import click
-import pandas as pd
 
 from app.filter_util import (
     composition,
@@ -11,107 +10,331 @@ from app.filter_util import (
     prevalence,
     processor,
     prompt,
+    store,
 )
+from app.filter_util.writer import DEFAULT_WORKERS, OutputWriter
+from app.options import SPLIT_METHODS
+from app.util import archive, table, workspace
 
 
-def run_filter_option(script_path):
-    """Filtering function coded by Emil Jaffal."""
-    prompt.sort_formulas_in_excel_or_folder(
-        script_path, os.listdir(script_path)
-    )
+def run_filter_option(
+    script_path,
+    checkpoint=False,
+    workers=DEFAULT_WORKERS,
+    processes=False,
+    workbook=False,
+    heatmaps_by=(),
+    tokenize=False,
+):
+    """Filtering function coded by Emil Jaffal.
 
-    # Display .cif files and .xlsx files in the script's directory
-    available_files = [
-        file
-        for file in os.listdir(script_path)
-        if file.endswith(".xlsx") and not file.endswith("_errors.xlsx")
-    ]
-    available_files.sort()
+    The stages pass DataFrames in memory and hand every output table
+    and figure to a background writer with a pool of ``workers``
+    threads, or processes with ``processes``. The outputs of the
+    finished stages are written before the split prompts, and all
+    writes are waited for and failures reported before returning. With
+    ``workbook``, the tables are written as the sheets of one
+    ``_outputs.xlsx`` workbook.
+    With ``checkpoint``, each output is written as soon as it is ready
+    and the parsed and filtered sheets are read back from disk before
+    the next stage, as before.
 
-    if not available_files:
-        click.secho(
-            "No files found in the directory",
-            fg="yellow",
+    ``heatmaps_by`` names columns, e.g. ``("System", "Structure")``, to
+    save one extra periodic table heatmap per value of, all rendered on
+    one base figure.
+
+    With ``tokenize``, formulas with groups, hydrates, fractions or
+    repeated elements are read by parser.tokenize_formula, which sums
+    repeated elements, see parser.parse_formula_column.
+    """
+    with OutputWriter(
+        eager=checkpoint,
+        workers=workers,
+        processes=processes,
+        workbook=workbook,
+    ) as writer:
+        _run_filter(script_path, writer, checkpoint, heatmaps_by, tokenize)
+
+
+def run_filter(
+    input_path,
+    output_dir=None,
+    parse=True,
+    split=None,
+    exclude=(),
+    heatmaps_by=(),
+    checkpoint=False,
+    workers=DEFAULT_WORKERS,
+    processes=False,
+    workbook=False,
+    cif_workers=None,
+    tokenize=False,
+):
+    """Run the filter option on one input without prompting.
+
+    ``input_path`` is a CIF folder or archive, or a table whose formulas
+    are parsed first. With ``parse`` False, a table is summarized as an
+    already parsed sheet. Outputs are saved in ``output_dir``, by
+    default the folder holding the input. The filtered entries are then
+    split by System with ``split="system"``, or into the entries with
+    and without the ``exclude`` elements with ``split="elements"``. The
+    CIF files are read by ``cif_workers`` processes, one per CPU by
+    default. The other arguments are those of run_filter_option.
+
+    Raises:
+        RuntimeError: If some outputs could not be saved.
+    """
+    if split is not None and split not in SPLIT_METHODS:
+        raise ValueError(
+            f"Unknown split {split!r}, choose one of "
+            f"{', '.join(SPLIT_METHODS)}."
+        )
+    if split == "elements" and not exclude:
+        raise ValueError("Splitting by elements needs elements to exclude.")
+    output_dir = output_dir or os.path.dirname(os.path.abspath(input_path))
+    with OutputWriter(
+        eager=checkpoint,
+        workers=workers,
+        processes=processes,
+        workbook=workbook,
+    ) as writer:
+        if os.path.isdir(input_path) or archive.is_cif_archive(input_path):
+            parsed = prompt.parse_cif_folder(
+                input_path, output_dir, writer, workers=cif_workers
+            )
+        elif parse:
+            parsed = prompt.parse_table_file(input_path, writer, output_dir)
+        else:
+            parsed = table.read_table(input_path), input_path
+        df, excel_file_path = parsed
+        click.secho(f"Summarizing file: {excel_file_path}", fg="cyan")
+        if checkpoint:
+            df = table.read_table(excel_file_path)
+        _summarize(
+            df,
+            excel_file_path,
+            output_dir,
+            writer,
+            checkpoint,
+            heatmaps_by,
+            split,
+            list(exclude),
+            tokenize=tokenize,
+        )
+        failures = writer.flush()
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} outputs of {input_path} could not be saved."
         )
-        return
 
-    click.secho(
-        "Which file would you like to summarize (If you picked option 1, "
-        " select the file ending with _sorted.xlsx):",
-        fg="cyan",
+
+def _run_filter(
+    script_path, writer, checkpoint, heatmaps_by=(), tokenize=False
+):
+    ws = workspace.get_workspace(script_path)
+    parsed = prompt.sort_formulas_in_excel_or_folder(
+        script_path, ws.dirs + ws.files, writer
     )
-    for idx, file_name in enumerate(available_files, start=1):
-        click.echo(f"[{idx}] {file_name}")
-    file_choice = click.prompt(
-        "Enter the number corresponding to your choice", type=int
+
+    if parsed is not None:
+        # Continue with the sheet parsed above instead of re-selecting it
+        invalid_formulas, excel_file_path = parsed
+        click.secho(f"Summarizing file: {excel_file_path}", fg="cyan")
+        if checkpoint:
+            invalid_formulas = table.read_table(excel_file_path)
+    else:
+        excel_file_path = _choose_filtered_sheet(script_path, ws)
+        if excel_file_path is None:
+            return
+        invalid_formulas = table.read_table(excel_file_path)
+    _summarize(
+        invalid_formulas,
+        excel_file_path,
+        script_path,
+        writer,
+        checkpoint,
+        heatmaps_by,
+        split="ask",
+        tokenize=tokenize,
     )
-    if 1 <= file_choice <= len(available_files):
-        excel_file_path = os.path.join(
-            script_path, available_files[file_choice - 1]
+
+
+def _summarize(
+    invalid_formulas,
+    excel_file_path,
+    script_path,
+    writer,
+    checkpoint,
+    heatmaps_by=(),
+    split=None,
+    exclude=(),
+    tokenize=False,
+):
+    """Summarize a parsed sheet into ``script_path``, then split its
+    filtered entries as given by ``split``, or as asked with
+    ``"ask"``."""
+    base_name = os.path.splitext(os.path.basename(excel_file_path))[0]
+    if writer.workbook:
+        writer.use_workbook(
+            os.path.join(script_path, f"{base_name}_outputs.xlsx")
         )
-        click.secho(f"Summarizing file: {excel_file_path}", fg="cyan")
 
     # Define a list of symbols that are not elements
     elements = data.get_element_list()
 
-    # Define a DataFrame with invalid formulas
-    invalid_formulas = pd.read_excel(excel_file_path)
-
-    # Apply the function to each row in the DataFrame
-    parsed_data = (
-        invalid_formulas["Formula"]
-        .apply(parser.parse_formula2)
-        .apply(pd.Series)
+    # Tokenize the whole Formula column at once. Compositions are kept
+    # in a compact store whose rows match the DataFrame's RangeIndex
+    invalid_formulas = invalid_formulas.reset_index(drop=True)
+    long_df = parser.parse_formula_column(
+        invalid_formulas["Formula"], verbose=True, tokenize=tokenize
+    )
+    comp_store = store.CompositionStore.from_long(
+        long_df, len(invalid_formulas)
     )
-    invalid_formulas[["Elements", "Counts", "Error"]] = parsed_data.iloc[:, :3]
+    invalid_formulas["Error"] = parser.get_error_messages(
+        long_df, len(invalid_formulas)
+    ).to_numpy()
 
     view_errors = "y"  # Default to 'yes' without prompting
 
     if view_errors == "y":
         # Filter the DataFrame for rows where the Error column is not None
         errors_df = invalid_formulas[invalid_formulas["Error"].notna()]
-        handler.handle_errors(errors_df, excel_file_path, script_path)
+        handler.handle_errors(
+            comp_store.attach_list_columns(errors_df),
+            excel_file_path,
+            script_path,
+            writer=writer,
+        )
 
     # Classification of formulas
     invalid_formulas_copy = composition.numerical_classification(
-        invalid_formulas
+        invalid_formulas, comp_store
     )
 
-    base_name = os.path.splitext(os.path.basename(excel_file_path))[0]
-    summary_filename = f"{base_name}_summary.xlsx"
+    summary_filename = table.output_filename(f"{base_name}_summary")
     summary_file_path = os.path.join(script_path, summary_filename)
-    invalid_formulas_copy.to_excel(summary_file_path, index=False)
-    click.secho(f"Summary saved to: {summary_file_path}", fg="cyan")
+    writer.save(
+        comp_store.attach_list_columns(invalid_formulas_copy),
+        summary_file_path,
+        f"Summary saved to: {summary_file_path}",
+    )
 
     click.secho("Filtering errors out of your dataframe", fg="cyan")
     filtered_df = invalid_formulas_copy[
         invalid_formulas_copy["Error"].isnull()
     ]
 
-    # Save the filtered DataFrame to an Excel file with '_filtered' suffix
-    base_name = os.path.splitext(os.path.basename(excel_file_path))[0]
-    filtered_filename = f"{base_name}_filtered.xlsx"
+    # Save the filtered DataFrame to a file with '_filtered' suffix
+    filtered_filename = table.output_filename(f"{base_name}_filtered")
     filtered_file_path = os.path.join(script_path, filtered_filename)
-    filtered_df.to_excel(filtered_file_path, index=False)
-
-    # Compile element counts
-    element_count_df = processor.compile_element_counts(
-        filtered_df, script_path, excel_file_path
+    filtered_output = comp_store.attach_list_columns(filtered_df)
+    writer.save(
+        filtered_output,
+        filtered_file_path,
+        f"Filtered sheet saved to: {filtered_file_path}",
     )
 
-    element_count_data_dict = prompt.dataframe_to_dict(
-        element_count_df, elements
+    # Compile element counts as a vector in atomic number order
+    element_counts = processor.compile_element_counts(
+        filtered_df,
+        script_path,
+        excel_file_path,
+        comp_store=comp_store.take(filtered_df.index.to_numpy()),
+        writer=writer,
     )
 
-    print(element_count_data_dict)
+    print(dict(zip(elements, element_counts.tolist())))
 
-    # Call the function with the list of elements and the relative path to
+    # Call the function with the element counts and the relative path to
     # the parent directory
     prevalence.element_prevalence(
-        pd.Series(element_count_data_dict), excel_file_path, script_path
+        element_counts, excel_file_path, script_path, writer=writer
     )
+    if heatmaps_by:
+        _save_group_heatmaps(
+            filtered_df,
+            comp_store,
+            heatmaps_by,
+            script_path,
+            base_name,
+            workers=writer.workers if writer.processes else 1,
+        )
+
+    filtered_output = None if checkpoint else filtered_output
+    if split == "ask":
+        # Write the outputs of the finished stages before prompting
+        writer.flush(sheets=False)
+        composition.numerical_and_elemental_filtering(
+            filtered_file_path,
+            invalid_formulas_copy,
+            comp_store,
+            filtered_df=filtered_output,
+            writer=writer,
+        )
+    elif split == "system":
+        composition.split_by_system(
+            filtered_file_path, filtered_output, writer=writer
+        )
+    elif split == "elements":
+        composition.split_by_elements(
+            filtered_file_path,
+            invalid_formulas_copy,
+            comp_store,
+            exclude,
+            writer=writer,
+        )
+
 
-    # Call numerical_and_elemental_filtering function
-    composition.numerical_and_elemental_filtering(
-        filtered_file_path, invalid_formulas_copy
+def _save_group_heatmaps(
+    df, comp_store, columns, script_path, base_name, workers=1
+):
+    """Save the heatmap of every group of rows of each column."""
+    jobs = {}
+    for column in columns:
+        if column not in df:
+            click.secho(f"No {column} column to group heatmaps by", fg="red")
+            continue
+        vectors = processor.group_element_counts(df, comp_store, column)
+        for group, vector in vectors.items():
+            path = prevalence.get_group_heatmap_path(
+                script_path, base_name, f"{column}_{group}"
+            )
+            jobs[path] = vector
+    for path in prevalence.render_heatmaps(jobs, workers=workers):
+        click.secho(
+            f"Periodic table created successfully in {path}", fg="cyan"
+        )
+
+
+def _choose_filtered_sheet(script_path, ws):
+    """Ask for the sheet to summarize among the table files."""
+    available_files = [
+        file
+        for file in ws.files_with_ext(*table.TABLE_EXTENSIONS)
+        if not os.path.splitext(file)[0].endswith("_errors")
+    ]
+
+    if not available_files:
+        click.secho(
+            "No files found in the directory",
+            fg="yellow",
+        )
+        return None
+
+    click.secho(
+        "Which file would you like to summarize:",
+        fg="cyan",
     )
+    for idx, file_name in enumerate(available_files, start=1):
+        click.echo(f"[{idx}] {file_name}")
+    file_choice = click.prompt(
+        "Enter the number corresponding to your choice", type=int
+    )
+    if 1 <= file_choice <= len(available_files):
+        excel_file_path = os.path.join(
+            script_path, available_files[file_choice - 1]
+        )
+        click.secho(f"Summarizing file: {excel_file_path}", fg="cyan")
+        return excel_file_path
+    return None
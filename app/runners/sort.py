@@ -1,13 +1,17 @@
 import os
 
 import click
-import pandas as pd
 from bobleesj.utils.parsers.formula import Formula
 from bobleesj.utils.sorters.element_sorter import ElementSorter
 from bobleesj.utils.sources.oliynyk import Oliynyk
 from bobleesj.utils.sources.oliynyk import Property as P
 
-from app.util import folder, prompt
+from app.options import SORT_METHODS
+from app.util import dedupe, folder, prompt, table
+
+CUSTOM_LABELS_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "data", "sort", "custom-labels.xlsx"
+)
 
 
 def run_sort_option(script_dir_path):
@@ -18,24 +22,84 @@ def run_sort_option(script_dir_path):
         )
         if formula_excel_path:
             print(f"You've selected: {formula_excel_path}")
-    dir_path, base_name = os.path.split(formula_excel_path)
-    excel_filename = os.path.splitext(base_name)[0]
-    df = pd.read_excel(formula_excel_path)
-    # Read the Formula or formula column into a list of formulas
-    formulas = _extract_formulas(df)
     if sort_method == 1:
-        _run_sort_by_custom_label(formulas, df, dir_path, excel_filename)
+        sort_file(formula_excel_path, "custom")
     elif sort_method == 2:
-        _run_sort_by_stoichiometry(formulas, df, dir_path, excel_filename)
+        is_ascending, is_normalized = _ask_ascending_normalize()
+        sort_file(
+            formula_excel_path,
+            "stoichiometry",
+            ascending=is_ascending,
+            normalize=is_normalized,
+        )
     elif sort_method == 3:
-        _run_sort_by_property(formulas, df, dir_path, excel_filename)
+        selected_property = P.select()
+        is_ascending, is_normalized = _ask_ascending_normalize()
+        sort_file(
+            formula_excel_path,
+            "property",
+            property_name=selected_property.name,
+            ascending=is_ascending,
+            normalize=is_normalized,
+        )
 
 
-def _extract_formulas(df):
-    if "Formula" in df.columns:
-        return df["Formula"].tolist()
-    elif "formula" in df.columns:
-        return df["formula"].tolist()
+def sort_file(
+    file_path,
+    method,
+    property_name=None,
+    ascending=True,
+    normalize=False,
+    output_dir=None,
+):
+    """Sort the formulas of a table file without prompting.
+
+    ``method`` is one of SORT_METHODS. ``property_name`` names an
+    Oliynyk Property, e.g. ``MEND_NUM``, for the property method. The
+    sorted table is saved in ``output_dir``, by default next to the
+    input file, and its path is returned.
+    """
+    if method not in SORT_METHODS:
+        raise ValueError(
+            f"Unknown sort method {method!r}, choose one of "
+            f"{', '.join(SORT_METHODS)}."
+        )
+    if method == "property" and property_name not in P.__members__:
+        raise ValueError(
+            f"Unknown property {property_name!r}, choose one of "
+            f"{', '.join(P.__members__)}."
+        )
+    dir_path, base_name = os.path.split(file_path)
+    dir_path = output_dir or dir_path
+    excel_filename = os.path.splitext(base_name)[0]
+    # Check the Formula or formula column before reading the whole sheet
+    formula_col = _find_formula_column(table.get_columns(file_path))
+    df = table.read_table(file_path)
+    formulas = df[formula_col].tolist()
+    if method == "custom":
+        return _run_sort_by_custom_label(
+            formulas, df, dir_path, excel_filename
+        )
+    if method == "stoichiometry":
+        return _run_sort_by_stoichiometry(
+            formulas, df, dir_path, excel_filename, ascending, normalize
+        )
+    return _run_sort_by_property(
+        formulas,
+        df,
+        dir_path,
+        excel_filename,
+        P[property_name],
+        ascending,
+        normalize,
+    )
+
+
+def _find_formula_column(columns):
+    if "Formula" in columns:
+        return "Formula"
+    elif "formula" in columns:
+        return "formula"
     else:
         raise ValueError(
             "No 'Formula' or 'formula' column found in the Excel file."
@@ -44,51 +108,62 @@ def _extract_formulas(df):
 
 def _save_and_update(df, formulas_sorted, dir_path, filename):
     df["Sorted Formula"] = formulas_sorted
-    _save_sorted_to_excel(df, dir_path, filename)
+    return _save_sorted_to_excel(df, dir_path, filename)
 
 
 def _run_sort_by_custom_label(formulas, df, dir_path, filename):
-    element_sorter = ElementSorter(excel_path="data/sort/custom-labels.xlsx")
-    formulas_sorted = [
-        Formula(formula).sort_by_custom_label(element_sorter.label_mapping)
-        for formula in formulas
-    ]
+    element_sorter = ElementSorter(excel_path=CUSTOM_LABELS_PATH)
+    formulas_sorted = dedupe.apply_unique(
+        lambda formula: Formula(formula).sort_by_custom_label(
+            element_sorter.label_mapping
+        ),
+        formulas,
+    )
     filename = f"{filename}_by_custom_label"
-    _save_and_update(df, formulas_sorted, dir_path, filename)
+    return _save_and_update(df, formulas_sorted, dir_path, filename)
 
 
-def _run_sort_by_stoichiometry(formulas, df, dir_path, filename):
-    is_ascending, is_normalized = _ask_ascending_normalize()
+def _run_sort_by_stoichiometry(
+    formulas, df, dir_path, filename, is_ascending, is_normalized
+):
     oliynyk = Oliynyk()
-    formulas_sorted = [
-        Formula(formula).sort_by_stoichiometry(
+
+    def _sort(formula):
+        return Formula(formula).sort_by_stoichiometry(
             oliynyk.get_property_data_for_formula(formula, P.MEND_NUM),
             ascending=is_ascending,
             normalize=is_normalized,
         )
-        for formula in formulas
-    ]
+
+    formulas_sorted = dedupe.apply_unique(_sort, formulas)
     filename = _add_suffixes(
         filename + "_by_stoichiometry", is_ascending, is_normalized
     )
-    _save_and_update(df, formulas_sorted, dir_path, filename)
-
-
-def _run_sort_by_property(formulas, df, dir_path, filename):
-    selected_property = P.select()
+    return _save_and_update(df, formulas_sorted, dir_path, filename)
+
+
+def _run_sort_by_property(
+    formulas,
+    df,
+    dir_path,
+    filename,
+    selected_property,
+    is_ascending,
+    is_normalized,
+):
     oliynyk = Oliynyk()
-    is_ascending, is_normalized = _ask_ascending_normalize()
-    formulas_sorted = [
-        Formula(formula).sort_by_elemental_property(
+
+    def _sort(formula):
+        return Formula(formula).sort_by_elemental_property(
             oliynyk.get_property_data_for_formula(formula, selected_property),
             ascending=is_ascending,
             normalize=is_normalized,
         )
-        for formula in formulas
-    ]
+
+    formulas_sorted = dedupe.apply_unique(_sort, formulas)
     filename = f"{filename}_by_property_{selected_property.name}"
     filename = _add_suffixes(filename, is_ascending, is_normalized)
-    _save_and_update(df, formulas_sorted, dir_path, filename)
+    return _save_and_update(df, formulas_sorted, dir_path, filename)
 
 
 def _add_suffixes(filename, is_ascending, is_normalized, method=None):
@@ -108,9 +183,10 @@ def _ask_ascending_normalize():
 
 
 def _save_sorted_to_excel(df, dir_path, filename):
-    output_path = os.path.join(dir_path, f"{filename}.xlsx")
-    df.to_excel(output_path, index=False)
+    output_path = os.path.join(dir_path, table.output_filename(filename))
+    table.write_table(df, output_path)
     print(f"Sorted formulas saved to {output_path}")
+    return output_path
 
 
 def _ascend_order():
@@ -0,0 +1,157 @@
+import io
+import os
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from app.util import parser, scan
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar.gz", ".tgz", ".tar")
+
+
+def is_archive_name(path):
+    """Return True if the path has a zip or tar archive extension."""
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def is_cif_archive(path):
+    """Return True if the path is a zip or tar archive file."""
+    return is_archive_name(path) and os.path.isfile(path)
+
+
+def get_archive_stem(path):
+    """Return the base name of a folder or archive without the archive
+    extension, e.g. "icsd" for "icsd.tar.gz"."""
+    name = os.path.basename(os.path.normpath(path))
+    for ext in ARCHIVE_EXTENSIONS:
+        if name.lower().endswith(ext):
+            return name[: -len(ext)]
+    return name
+
+
+def iter_cif_members(archive_path):
+    """Yield (member name, binary file object) pairs for every .cif
+    member in archive order.
+
+    Tar archives are read as a stream, so each file object is only valid
+    until the next pair is requested.
+    """
+    if archive_path.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.endswith(".cif"):
+                    continue
+                with archive.open(info) as file:
+                    yield info.filename, file
+        return
+    with tarfile.open(archive_path, "r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.endswith(".cif"):
+                continue
+            yield member.name, archive.extractfile(member)
+
+
+def _parse_member_chunk(contents, fields):
+    """Parse the header records of a batch of in-memory members."""
+    return [parser.parse_cif_header_bytes(data, fields) for data in contents]
+
+
+def iter_archive_headers(
+    archive_path, fields=scan.CIF_COLUMNS, workers=1, chunk_size=500
+):
+    """Stream (member name, header record) pairs of a CIF archive.
+
+    With one worker only each member's header is read. Otherwise
+    members are read whole in this process and parsed in batches of
+    ``chunk_size`` over a process pool, keeping the archive order.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for name, file in iter_cif_members(archive_path):
+            yield name, parser.read_cif_header(file, fields)
+        return
+
+    def _batches():
+        names, contents = [], []
+        for name, file in iter_cif_members(archive_path):
+            names.append(name)
+            contents.append(file.read())
+            if len(names) == chunk_size:
+                yield names, contents
+                names, contents = [], []
+        if names:
+            yield names, contents
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for names, contents in _batches():
+            future = executor.submit(_parse_member_chunk, contents, fields)
+            pending.append((names, future))
+            if len(pending) >= 2 * workers:
+                names, future = pending.popleft()
+                yield from zip(names, future.result())
+        while pending:
+            names, future = pending.popleft()
+            yield from zip(names, future.result())
+
+
+def scan_cif_archive(archive_path, workers=1, chunk_size=500):
+    """Parse every CIF member of an archive into an
+    Entry/Formula/Structure DataFrame."""
+    records = [
+        record
+        for _, record in iter_archive_headers(
+            archive_path,
+            scan.CIF_COLUMNS,
+            workers=workers,
+            chunk_size=chunk_size,
+        )
+    ]
+    return pd.DataFrame(records, columns=list(scan.CIF_COLUMNS))
+
+
+def _open_archive_writer(archive_path):
+    if archive_path.lower().endswith(".zip"):
+        return zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED)
+    mode = "w" if archive_path.lower().endswith(".tar") else "w:gz"
+    return tarfile.open(archive_path, mode)
+
+
+def _write_member(writer, name, data):
+    if isinstance(writer, zipfile.ZipFile):
+        writer.writestr(name, data)
+    else:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        writer.addfile(info, io.BytesIO(data))
+
+
+def split_cif_archive(archive_path, matched_ids):
+    """Copy the members of a CIF archive into "_matched" and
+    "_unmatched" archives of the same format next to it, based on
+    whether their entry ID is in ``matched_ids``.
+
+    Returns:
+        tuple[str, str]: Paths of the matched and unmatched archives.
+    """
+    directory = os.path.dirname(archive_path)
+    stem = get_archive_stem(archive_path)
+    ext = os.path.basename(archive_path)[len(stem) :]
+    matched_path = os.path.join(directory, f"{stem}_matched{ext}")
+    unmatched_path = os.path.join(directory, f"{stem}_unmatched{ext}")
+
+    with _open_archive_writer(matched_path) as matched, _open_archive_writer(
+        unmatched_path
+    ) as unmatched:
+        for name, file in iter_cif_members(archive_path):
+            data = file.read()
+            entry = parser.parse_cif_header_bytes(data, ("Entry",))["Entry"]
+            try:
+                is_matched = int(entry) in matched_ids
+            except (TypeError, ValueError):
+                is_matched = False
+            _write_member(matched if is_matched else unmatched, name, data)
+    return matched_path, unmatched_path
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+
+import pandas as pd
+
+from app.util import scan
+
+INDEX_FILENAME = ".cif_index.sqlite"
+INDEX_COLUMNS = ("Path", "Entry", "Formula", "Structure", "Error")
+
+# Version of the records, stored as the index's user_version. Bump it
+# whenever scan.read_cif_headers changes what it returns, so indexes
+# built by an older parser are rebuilt instead of served stale
+INDEX_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cif_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    entry TEXT,
+    formula TEXT,
+    structure TEXT,
+    error TEXT
+)
+"""
+
+
+def get_index_path(folder_path):
+    """Return the path of the sidecar index stored in a CIF folder."""
+    return os.path.join(folder_path, INDEX_FILENAME)
+
+
+def _open(database):
+    """Open an index, emptying it if its records have another
+    version."""
+    connection = sqlite3.connect(database)
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_VERSION:
+            with connection:
+                connection.execute("DROP TABLE IF EXISTS cif_files")
+                connection.execute(_SCHEMA)
+                connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+    except sqlite3.Error:
+        connection.close()
+        raise
+    return connection
+
+
+def _connect(folder_path):
+    """Open the sidecar index, falling back to an in-memory database
+    when the folder is not writable."""
+    try:
+        return _open(get_index_path(folder_path))
+    except sqlite3.Error:
+        return _open(":memory:")
+
+
+def _relative_path(file_path, folder_path):
+    return os.path.relpath(file_path, folder_path).replace(os.sep, "/")
+
+
+def load_cif_index(folder_path, recursive=True, workers=1, chunk_size=500):
+    """Return the header records of every CIF file in a folder, parsing
+    only the files that are new or changed since the last call.
+
+    Records are cached in a SQLite sidecar inside the folder, keyed by
+    relative path and invalidated on size or mtime change, or when
+    INDEX_VERSION changes. Rows of files that no longer exist are
+    pruned. A read-only or locked index is not updated, and the
+    records parsed in this call are still returned.
+
+    Returns:
+        pd.DataFrame: Path, Entry, Formula, Structure and Error columns,
+        in the order given by scan.list_cif_files.
+    """
+    file_paths = scan.list_cif_files(folder_path, recursive=recursive)
+    rel_paths = [_relative_path(p, folder_path) for p in file_paths]
+    stats = [os.stat(p) for p in file_paths]
+
+    connection = _connect(folder_path)
+    try:
+        cached = {
+            row[0]: row
+            for row in connection.execute(
+                "SELECT path, size, mtime_ns, entry, formula, structure, "
+                "error FROM cif_files"
+            )
+        }
+    except sqlite3.Error:
+        cached = {}
+
+    # Prune deleted files within the scanned scope only
+    current = set(rel_paths)
+    removed = [
+        (path,)
+        for path in cached
+        if path not in current and (recursive or "/" not in path)
+    ]
+
+    stale = [
+        i
+        for i, (path, stat) in enumerate(zip(rel_paths, stats))
+        if path not in cached
+        or cached[path][1:3] != (stat.st_size, stat.st_mtime_ns)
+    ]
+    records = scan.read_cif_headers(
+        [file_paths[i] for i in stale],
+        scan.CIF_COLUMNS,
+        workers=workers,
+        chunk_size=chunk_size,
+        capture_errors=True,
+    )
+    new_rows = [
+        (
+            rel_paths[i],
+            stats[i].st_size,
+            stats[i].st_mtime_ns,
+            record["Entry"],
+            record["Formula"],
+            record["Structure"],
+            record["Error"],
+        )
+        for i, record in zip(stale, records)
+    ]
+    try:
+        with connection:
+            connection.executemany(
+                "DELETE FROM cif_files WHERE path = ?", removed
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO cif_files "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                new_rows,
+            )
+    except sqlite3.Error:
+        # A read-only or locked index is left as it is
+        pass
+    finally:
+        connection.close()
+
+    cached.update((row[0], row) for row in new_rows)
+    return pd.DataFrame(
+        [(path, *cached[path][3:]) for path in rel_paths],
+        columns=list(INDEX_COLUMNS),
+    )
+
+
+def clear_cif_index(folder_path):
+    """Delete the sidecar index of a CIF folder if it exists."""
+    index_path = get_index_path(folder_path)
+    if os.path.exists(index_path):
+        os.remove(index_path)
@@ -0,0 +1,46 @@
+import pandas as pd
+
+
+class UniqueValues:
+    """A column split by pd.factorize into its unique values and the
+    integer code of every row, so expensive work can run once per unique
+    value and be broadcast back to the rows.
+
+    Missing values are kept as one of the unique values.
+    """
+
+    def __init__(self, values):
+        self.codes, self.uniques = pd.factorize(
+            pd.Series(values, dtype=object), use_na_sentinel=False
+        )
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def num_unique(self):
+        return len(self.uniques)
+
+    @property
+    def ratio(self):
+        """Unique-to-total ratio, 1.0 for an empty column."""
+        return self.num_unique / len(self) if len(self) else 1.0
+
+    def report(self, label="formulas"):
+        print(
+            f"Processing {self.num_unique} unique of {len(self)} {label} "
+            f"({self.ratio:.1%})"
+        )
+
+    def broadcast(self, results):
+        """Map one result per unique value back to every row."""
+        return [results[code] for code in self.codes]
+
+
+def apply_unique(func, values, label="formulas", verbose=True):
+    """Call ``func`` once per unique value and return the result of
+    every row, in row order."""
+    unique = UniqueValues(values)
+    if verbose:
+        unique.report(label)
+    return unique.broadcast([func(value) for value in unique.uniques])
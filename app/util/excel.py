@@ -1,8 +1,6 @@
 import os
 
-import pandas as pd
-
-from app.util import parser
+from app.util import archive, cif_index, header, scan, table, workspace
 
 
 def select_directory_and_file(script_directory):
@@ -14,18 +12,15 @@ def select_directory_and_file(script_directory):
 
 
 def choose_excel_file(script_directory):
-    """Lets the user choose an Excel or CSV file from the specified
-    directory."""
-    files = [
-        f
-        for f in os.listdir(script_directory)
-        if f.endswith(".xlsx") or f.endswith(".csv")
-    ]
-    files.sort()
+    """Lets the user choose an Excel, CSV, Parquet or Feather file from
+    the specified directory."""
+    files = workspace.get_workspace(script_directory).files_with_ext(
+        *table.TABLE_EXTENSIONS
+    )
     if not files:
-        print("No Excel or CSV files found in the current path!")
+        print("No Excel, CSV, Parquet or Feather files found in the path!")
         return None
-    print("\nAvailable Excel/CSV files:")
+    print("\nAvailable Excel/CSV/Parquet/Feather files:")
     for idx, file_name in enumerate(files, start=1):
         print(f"{idx}. {file_name}")
     while True:
@@ -42,11 +37,10 @@ def choose_excel_file(script_directory):
 
 def choose_excel_sheet(excel_path):
     """Lets the user choose a sheet from the Excel file; returns None
-    for CSV."""
-    if excel_path.lower().endswith(".csv"):
+    for CSV, Parquet and Feather files."""
+    if not table.is_workbook(excel_path):
         return None
-    xls = pd.ExcelFile(excel_path)
-    sheets = xls.sheet_names
+    sheets = list(header.get_sheet_columns(excel_path))
     print("\nAvailable sheets:")
     for idx, sheet_name in enumerate(sheets, start=1):
         print(f"{idx}. {sheet_name}")
@@ -64,35 +58,51 @@ def choose_excel_sheet(excel_path):
 
 def load_data_from_excel(excel_path):
     column_name = "Entry"
-    ext = os.path.splitext(excel_path)[1].lower()
-    if ext == ".csv":
-        return load_csv_data_to_set(excel_path, column_name), None
+    if not table.is_workbook(excel_path):
+        return load_table_data_to_set(excel_path, column_name), None
     sheet = choose_excel_sheet(excel_path)
     return load_excel_data_to_set(excel_path, column_name, sheet), sheet
 
 
 def load_excel_data_to_set(excel_path, column_name, sheet_name):
-    df = pd.read_excel(excel_path, sheet_name=sheet_name)
+    if column_name not in table.get_columns(excel_path, sheet_name):
+        raise KeyError(column_name)
+    # Read only the requested column of the sheet
+    df = table.read_table(
+        excel_path, sheet_name=sheet_name, usecols=[column_name]
+    )
     return set(df[column_name].values)
 
 
-def load_csv_data_to_set(csv_path, column_name):
-    df = pd.read_csv(csv_path)
-    return set(df[column_name].values)
+def load_table_data_to_set(file_path, column_name):
+    """Read one column of a CSV, Parquet or Feather file into a set."""
+    return load_excel_data_to_set(file_path, column_name, None)
 
 
-def gather_cif_ids_from_files(folder_info):
-    files_lst = [
-        os.path.join(folder_info, f)
-        for f in os.listdir(folder_info)
-        if f.endswith(".cif")
-    ]
+def gather_cif_ids_from_files(folder_info, workers=None, use_index=True):
+    if archive.is_cif_archive(folder_info):
+        records = list(
+            archive.iter_archive_headers(
+                folder_info, ("Entry",), workers=workers
+            )
+        )
+        files_lst = [name for name, _ in records]
+        entries = [record["Entry"] for _, record in records]
+    elif use_index:
+        index_df = cif_index.load_cif_index(
+            folder_info, recursive=False, workers=workers
+        )
+        files_lst = index_df["Path"].tolist()
+        entries = index_df["Entry"].tolist()
+    else:
+        files_lst = scan.list_cif_files(folder_info, recursive=False)
+        records = scan.read_cif_headers(files_lst, ("Entry",), workers=workers)
+        entries = [record["Entry"] for record in records]
     cif_ids = set()
-    for file_path in files_lst:
-        cif_id = parser.get_cif_entry_id(file_path)
+    for file_path, cif_id in zip(files_lst, entries):
         try:
             cid_id = int(cif_id)
             cif_ids.add(cid_id)
-        except ValueError:
+        except (TypeError, ValueError):
             print(f"Error: Invalid CIF ID in {os.path.basename(file_path)}")
     return cif_ids, len(files_lst)
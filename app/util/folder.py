@@ -1,18 +1,18 @@
-import glob
 import os
 from os.path import join
 
-import pandas as pd
+from app.util import archive, header, table, workspace
 
 
 def list_xlsx_files_with_formula(script_dir_path):
-    """List Excel files in the given dir 'Formula' with column."""
+    """List Excel and other table files in the given dir with a
+    'Formula' column."""
     excel_files_with_paths = []
 
-    # Scan the directory for .xlsx files
-    excel_files = [
-        file for file in os.listdir(script_dir_path) if file.endswith(".xlsx")
-    ]
+    # Scan the directory for .xlsx, .csv, .parquet and .feather files
+    excel_files = workspace.get_workspace(script_dir_path).files_with_ext(
+        *table.TABLE_EXTENSIONS
+    )
 
     if not excel_files:
         return None
@@ -20,9 +20,9 @@ def list_xlsx_files_with_formula(script_dir_path):
     for file in excel_files:
         file_path = os.path.join(script_dir_path, file)
         try:
-            # Attempt to read the first column of the Excel file
-            df = pd.read_excel(file_path, nrows=0)  # Read only headers
-            if any(col.lower() == "formula" for col in df.columns):
+            # Read only the header row of the first sheet
+            columns = table.get_columns(file_path)
+            if header.find_column(columns, "formula") is not None:
                 excel_files_with_paths.append(file_path)
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
@@ -59,15 +59,12 @@ def list_xlsx_files_with_formula(script_dir_path):
 def choose_dir(script_directory, ext=".cif"):
     """Allows the user to select a directory from the given path."""
 
-    directories = [
-        d
-        for d in os.listdir(script_directory)
-        if os.path.isdir(join(script_directory, d))
-        and any(
-            file.endswith(ext)
-            for file in os.listdir(join(script_directory, d))
-        )
-    ]
+    ws = workspace.get_workspace(script_directory)
+    directories = ws.dirs_with_ext(ext)
+
+    # Zip/tar archives of CIF files are read without extraction
+    if ext == ".cif":
+        directories += ws.cif_archives()
 
     if not directories:
         print(
@@ -76,8 +73,10 @@ def choose_dir(script_directory, ext=".cif"):
         return None
     print(f"\nAvailable folders containing {ext} files:")
     for idx, dir_name in enumerate(directories, start=1):
-        if ext == ".cif":
-            num_of_cif_files = get_cif_file_count_from_directory(dir_name)
+        if archive.is_cif_archive(join(script_directory, dir_name)):
+            print(f"{idx}. {dir_name} (archive)")
+        elif ext == ".cif":
+            num_of_cif_files = ws.dir_count_ext(dir_name, ext)
             print(f"{idx}. {dir_name}, {num_of_cif_files} files")
         else:
             print(f"{idx}. {dir_name}")
@@ -117,8 +116,3 @@ def save_to_csv_directory(folder_info, df, base_filename):
     df.to_csv(join(csv_directory, csv_filename), index=False)
 
     print(csv_filename, "saved")
-
-
-def get_cif_file_count_from_directory(directory):
-    """Helper function to count .cif files in a given directory."""
-    return len(glob.glob(join(directory, "*.cif")))
@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from functools import wraps
+
+DEFAULT_MAXSIZE = 65536
+
+
+def _freeze(value):
+    """Convert lists in a parse result to tuples so cached results
+    cannot be modified by callers."""
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, tuple):
+        items = [_freeze(item) for item in value]
+        # Keep named tuples, e.g. parser.ParsedFormula
+        return value._make(items) if hasattr(value, "_make") else tuple(items)
+    return value
+
+
+class FormulaCache:
+    """Bounded LRU of parse results keyed by the raw formula string.
+
+    Each entry holds the result of every parser that has seen the
+    formula, so a formula is parsed once per parser and process no
+    matter how many rows repeat it.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, formula, kind, parse):
+        """Return the cached ``kind`` result for the formula, calling
+        ``parse(formula)`` on a miss."""
+        entry = self._entries.get(formula)
+        if entry is None:
+            entry = self._entries[formula] = {}
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(formula)
+        if kind in entry:
+            self.hits += 1
+            return entry[kind]
+        self.misses += 1
+        value = entry[kind] = _freeze(parse(formula))
+        return value
+
+    def info(self):
+        """Return the hit/miss statistics of the cache."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def report(self):
+        """Print the hit/miss statistics of the cache."""
+        info = self.info()
+        print(
+            f"Formula cache: {info['hits']} hits, {info['misses']} misses "
+            f"({info['hit_rate']:.1%}), {info['size']} of {info['maxsize']} "
+            "formulas kept"
+        )
+
+    def clear(self):
+        """Drop every entry and reset the statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+_cache = FormulaCache()
+
+
+def get_formula_cache():
+    """Return the process-wide formula cache."""
+    return _cache
+
+
+def cached_formula_parser(func):
+    """Memoize a single-argument formula parser in the shared cache."""
+    kind = f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def wrapper(formula):
+        try:
+            hash(formula)
+        except TypeError:
+            # Unhashable input, parse without caching
+            return _freeze(func(formula))
+        return _cache.get(formula, kind, func)
+
+    return wrapper
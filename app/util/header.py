@@ -0,0 +1,221 @@
+import json
+import os
+import posixpath
+import re
+import tempfile
+import zipfile
+from xml.etree import ElementTree
+
+import pandas as pd
+
+CACHE_FILENAME = ".header_cache.json"
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = (
+    "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+)
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_memory_cache = {}
+
+
+def _get_sheet_paths(archive):
+    """Return the sheet names of a workbook mapped to their XML paths,
+    in workbook order."""
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {
+        rel.get("Id"): rel.get("Target")
+        for rel in rels.iter(f"{_PKG_REL_NS}Relationship")
+    }
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    sheet_paths = {}
+    for sheet in workbook.iter(f"{_MAIN_NS}sheet"):
+        target = targets[sheet.get(f"{_REL_NS}id")]
+        if target.startswith("/"):
+            path = target.lstrip("/")
+        else:
+            path = posixpath.normpath(posixpath.join("xl", target))
+        sheet_paths[sheet.get("name")] = path
+    return sheet_paths
+
+
+def _column_index(cell_ref):
+    """Convert a cell reference such as "AB1" to a zero-based column."""
+    index = 0
+    for char in re.match(r"[A-Z]+", cell_ref).group():
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index - 1
+
+
+def _read_first_row(archive, sheet_path):
+    """Stream a sheet's XML and return its first row as (column index,
+    cell type, raw value) tuples without parsing the remaining rows."""
+    cells = []
+    next_index = 0
+    with archive.open(sheet_path) as file:
+        for event, elem in ElementTree.iterparse(file, events=("end",)):
+            if elem.tag == f"{_MAIN_NS}c":
+                value = elem.find(f"{_MAIN_NS}v")
+                if elem.get("t") == "inlineStr":
+                    text = "".join(elem.itertext())
+                else:
+                    text = value.text if value is not None else None
+                # Cells without a reference follow the previous one
+                ref = elem.get("r")
+                index = _column_index(ref) if ref else next_index
+                next_index = index + 1
+                if text is not None:
+                    cells.append((index, elem.get("t"), text))
+            elif elem.tag == f"{_MAIN_NS}row":
+                break
+    return cells
+
+
+def _read_shared_strings(archive, max_index):
+    """Stream the shared string table up to ``max_index`` only."""
+    strings = []
+    if max_index < 0 or "xl/sharedStrings.xml" not in archive.namelist():
+        return strings
+    with archive.open("xl/sharedStrings.xml") as file:
+        for event, elem in ElementTree.iterparse(file, events=("end",)):
+            if elem.tag != f"{_MAIN_NS}si":
+                continue
+            # Skip phonetic runs, which are not part of the cell text
+            phonetic = {t for rph in elem.iter(f"{_MAIN_NS}rPh") for t in rph}
+            strings.append(
+                "".join(
+                    t.text or ""
+                    for t in elem.iter(f"{_MAIN_NS}t")
+                    if t not in phonetic
+                )
+            )
+            elem.clear()
+            if len(strings) > max_index:
+                break
+    return strings
+
+
+def _to_header_value(cell_type, text, strings):
+    if cell_type == "s":
+        return strings[int(text)]
+    if cell_type in ("str", "inlineStr", "e"):
+        return text
+    if cell_type == "b":
+        return text == "1"
+    number = float(text)
+    return int(number) if number.is_integer() else number
+
+
+def _read_xlsx_sheet_columns(file_path):
+    """Read the header row of every sheet of an .xlsx workbook."""
+    with zipfile.ZipFile(file_path) as archive:
+        rows = {
+            sheet_name: _read_first_row(archive, sheet_path)
+            for sheet_name, sheet_path in _get_sheet_paths(archive).items()
+        }
+        max_index = max(
+            (
+                int(text)
+                for cells in rows.values()
+                for _, cell_type, text in cells
+                if cell_type == "s"
+            ),
+            default=-1,
+        )
+        strings = _read_shared_strings(archive, max_index)
+
+    sheet_columns = {}
+    for sheet_name, cells in rows.items():
+        values = {
+            index: _to_header_value(cell_type, text, strings)
+            for index, cell_type, text in cells
+        }
+        width = max(values, default=-1) + 1
+        # Name empty and duplicated header cells like pandas does
+        columns, seen = [], {}
+        for i in range(width):
+            column = values.get(i, f"Unnamed: {i}")
+            if column in seen:
+                seen[column] += 1
+                column = f"{column}.{seen[column]}"
+            else:
+                seen[column] = 0
+            columns.append(column)
+        sheet_columns[sheet_name] = columns
+    return sheet_columns
+
+
+def _read_sheet_columns_with_pandas(file_path):
+    sheets = pd.read_excel(file_path, sheet_name=None, nrows=0)
+    return {name: list(df.columns) for name, df in sheets.items()}
+
+
+def _load_disk_cache(directory):
+    try:
+        with open(os.path.join(directory, CACHE_FILENAME)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_disk_cache(directory, cache):
+    """Replace the JSON cache at once, so processes saving it at the
+    same time never leave a partly written file."""
+    temp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, suffix=".tmp", delete=False
+        ) as file:
+            temp_path = file.name
+            json.dump(cache, file)
+        os.replace(temp_path, os.path.join(directory, CACHE_FILENAME))
+    except OSError:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def get_sheet_columns(file_path):
+    """Return the column names of every sheet of an Excel workbook.
+
+    Only the first row of each sheet is streamed from the .xlsx XML.
+    Results are cached in memory and in a small JSON file next to the
+    workbook, keyed by file name, size and mtime.
+
+    Returns:
+        dict[str, list]: Sheet names mapped to their column names, in
+        workbook order.
+    """
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    key = [stat.st_size, stat.st_mtime_ns]
+    cached = _memory_cache.get(file_path)
+    if cached and cached["key"] == key:
+        return cached["sheets"]
+
+    directory, name = os.path.split(file_path)
+    disk_cache = _load_disk_cache(directory)
+    entry = disk_cache.get(name)
+    if not entry or entry["key"] != key:
+        try:
+            sheets = _read_xlsx_sheet_columns(file_path)
+        except (KeyError, ValueError, zipfile.BadZipFile):
+            sheets = _read_sheet_columns_with_pandas(file_path)
+        entry = {"key": key, "sheets": sheets}
+        disk_cache[name] = entry
+        _save_disk_cache(directory, disk_cache)
+    _memory_cache[file_path] = entry
+    return entry["sheets"]
+
+
+def get_columns(file_path, sheet_name=None):
+    """Return the column names of a sheet, the first one by default."""
+    sheets = get_sheet_columns(file_path)
+    if sheet_name is None:
+        return next(iter(sheets.values()), [])
+    return sheets[sheet_name]
+
+
+def find_column(columns, name):
+    """Return the first column matching the name case-insensitively, or
+    None."""
+    return next((c for c in columns if str(c).lower() == name.lower()), None)
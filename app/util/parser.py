@@ -1,134 +1,113 @@
+import mmap
+import os
 import re
+from functools import lru_cache
 
+import numpy as np
 import pandas as pd
 
+STOICHIOMETRY_PATTERN = re.compile(r"([A-Z][a-z]*)(\d*\.?\d*)")
 
-def get_parsed_binary_formula_df(formulas):
-    data = []
-    for formula in formulas:
-        parsed_formula = get_parsed_formula(formula)
-        element_A = parsed_formula[0][0]
-        element_B = parsed_formula[1][0]
-
-        # Convert indices to float, default to 1.0 if empty
-        element_A_index = (
-            float(parsed_formula[0][1]) if parsed_formula[0][1] else 1.0
-        )
-        element_B_index = (
-            float(parsed_formula[1][1]) if parsed_formula[1][1] else 1.0
-        )
 
-        normalized_formula = get_normalized_formula(formula)
-        parsed_normalized_formula = get_parsed_formula(normalized_formula)
-        element_A_normalized_index = (
-            float(parsed_normalized_formula[0][1])
-            if parsed_normalized_formula[0][1]
-            else 1.0
-        )
-        element_B_normalized_index = (
-            float(parsed_normalized_formula[1][1])
-            if parsed_normalized_formula[1][1]
-            else 1.0
-        )
+def get_stoichiometry_arrays(formulas):
+    """Parse formulas with any number of elements into padded arrays.
 
-        # Append to data list
-        data.append(
-            [
-                formula,
-                element_A,
-                element_B,
-                element_A_index,
-                element_B_index,
-                element_A_normalized_index,
-                element_B_normalized_index,
-            ]
-        )
+    Every formula is tokenized by a single regex pass and the tokens are
+    scattered into 2D arrays, so the normalized indices are the raw ones
+    divided by their row sum in one vectorized operation.
 
-    main_df = pd.DataFrame(
-        data,
-        columns=[
-            "Formula",
-            "Element A",
-            "Element B",
-            "Index_A",
-            "Index_B",
-            "Normalized_Index_A",
-            "Normalized_Index_B",
-        ],
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Element symbols
+        (object, "" as padding), raw indices and normalized indices
+        (float64, NaN as padding), each of shape (number of formulas,
+        largest number of elements).
+    """
+    tokens = [
+        (
+            STOICHIOMETRY_PATTERN.findall(formula)
+            if isinstance(formula, str)
+            else []
+        )
+        for formula in formulas
+    ]
+    sizes = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+    rows = np.repeat(np.arange(len(tokens)), sizes)
+    slots = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    width = int(sizes.max()) if len(sizes) else 0
+
+    flat = [token for row in tokens for token in row]
+    symbols = np.full((len(tokens), width), "", dtype=object)
+    raw = np.full((len(tokens), width), np.nan)
+    symbols[rows, slots] = [element for element, _ in flat]
+    # A missing index counts as 1
+    raw[rows, slots] = pd.to_numeric(
+        pd.Series([index or "1" for _, index in flat], dtype=object),
+        errors="coerce",
     )
-    return main_df
-
 
-def get_parsed_ternary_formula_df(formulas):
-    data = []
-    for formula in formulas:
-        parsed_formula = get_parsed_formula(formula)
-        element_R = parsed_formula[0][0]
-        element_M = parsed_formula[1][0]
-        element_X = parsed_formula[2][0]
-
-        # Convert indices to float, default to 1.0 if empty
-        element_R_index = (
-            float(parsed_formula[0][1]) if parsed_formula[0][1] else 1.0
-        )
-        element_M_index = (
-            float(parsed_formula[1][1]) if parsed_formula[1][1] else 1.0
-        )
-        element_X_index = (
-            float(parsed_formula[2][1]) if parsed_formula[2][1] else 1.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalized = raw / np.nansum(raw, axis=1, keepdims=True)
+    return symbols, raw, normalized
+
+
+def get_normalized_formula_strings(symbols, normalized, decimal_places=3):
+    """Format the rows of get_stoichiometry_arrays as normalized formula
+    strings, e.g. "Fe0.400O0.600"."""
+    strings = np.full(len(symbols), "", dtype=object)
+    for j in range(symbols.shape[1]):
+        present = symbols[:, j] != ""
+        values = np.char.mod(f"%.{decimal_places}f", normalized[present, j])
+        strings[present] += symbols[present, j] + values.astype(object)
+    return strings
+
+
+def get_parsed_formula_df(formulas, labels=None, normalized_formula=False):
+    """Return the elements, indices and normalized indices of formulas.
+
+    Args:
+        formulas (list | pd.Series): Formula strings.
+        labels (str | list, optional): Column suffix of each element
+            position, e.g. "AB" or "RMX". Defaults to 1, 2, ... up to
+            the largest number of elements. Extra elements are dropped
+            and missing ones left empty.
+        normalized_formula (bool): Add a "Normalized_Formula" string
+            column.
+
+    Returns:
+        pd.DataFrame: "Formula", "Element {label}", "Index_{label}" and
+        "Normalized_Index_{label}" columns.
+    """
+    symbols, raw, normalized = get_stoichiometry_arrays(formulas)
+    if labels is None:
+        labels = [str(i + 1) for i in range(symbols.shape[1])]
+    num_labels = len(labels)
+
+    def _fit(array, fill):
+        if array.shape[1] >= num_labels:
+            return array[:, :num_labels]
+        padding = np.full((len(array), num_labels - array.shape[1]), fill)
+        return np.hstack([array, padding.astype(array.dtype)])
+
+    columns = {"Formula": list(formulas)}
+    fitted = [_fit(symbols, ""), _fit(raw, np.nan), _fit(normalized, np.nan)]
+    for prefix, array in zip(
+        ["Element ", "Index_", "Normalized_Index_"], fitted
+    ):
+        for i, label in enumerate(labels):
+            columns[f"{prefix}{label}"] = array[:, i]
+    if normalized_formula:
+        columns["Normalized_Formula"] = get_normalized_formula_strings(
+            symbols, normalized
         )
+    return pd.DataFrame(columns)
 
-        normalized_formula = get_normalized_formula(formula)
-        parsed_normalized_formula = get_parsed_formula(normalized_formula)
-        element_R_normalized_index = (
-            float(parsed_normalized_formula[0][1])
-            if parsed_normalized_formula[0][1]
-            else 1.0
-        )
-        element_M_normalized_index = (
-            float(parsed_normalized_formula[1][1])
-            if parsed_normalized_formula[1][1]
-            else 1.0
-        )
-        element_X_normalized_index = (
-            float(parsed_normalized_formula[2][1])
-            if parsed_normalized_formula[2][1]
-            else 1.0
-        )
 
-        # Append to data list
-        data.append(
-            [
-                formula,
-                element_R,
-                element_M,
-                element_X,
-                element_R_index,
-                element_M_index,
-                element_X_index,
-                element_R_normalized_index,
-                element_M_normalized_index,
-                element_X_normalized_index,
-            ]
-        )
+def get_parsed_binary_formula_df(formulas):
+    return get_parsed_formula_df(formulas, labels="AB")
 
-    # Create a DataFrame
-    main_df = pd.DataFrame(
-        data,
-        columns=[
-            "Formula",
-            "Element R",
-            "Element M",
-            "Element X",
-            "Index_R",
-            "Index_M",
-            "Index_X",
-            "Normalized_Index_R",
-            "Normalized_Index_X",
-            "Normalized_Index_M",
-        ],
-    )
-    return main_df
+
+def get_parsed_ternary_formula_df(formulas):
+    return get_parsed_formula_df(formulas, labels="RMX")
 
 
 def get_parsed_formula(formula):
@@ -207,51 +186,134 @@ def extract_tag_from_line(line):
     return None
 
 
-def get_cif_structure(file_path):
-    """Extracts the CIF structure from a file."""
-    target_line_start = "_chemical_name_structure_type"
+CIF_HEADER_BYTES = 4096
+
+CIF_HEADER_PATTERNS = {
+    # ICSD "_database_code_ICSD 123" and PCD "#_database_code_PCD 123"
+    "Entry": re.compile(
+        rb"^[ \t]*#?_database_code\S*[ \t]+(\S+)[ \t\r]*$", re.M
+    ),
+    "Formula": re.compile(rb"^[ \t]*_chemical_formula_sum(.*)$", re.M),
+    "Structure": re.compile(
+        rb"^[ \t]*_chemical_name_structure_type(.*)$", re.M
+    ),
+}
+
+CIF_HEADER_DEFAULTS = {
+    "Entry": None,
+    "Formula": "Formula not found",
+    "Structure": "Structure not found",
+}
+
+
+@lru_cache(maxsize=None)
+def _get_cif_tag_pattern(tag):
+    """Compile the pattern of a raw CIF tag such as "_cell_volume"."""
+    return re.compile(
+        rb"^[ \t]*" + re.escape(tag.encode()) + rb"(?:[ \t]+(.*?))?[ \t\r]*$",
+        re.M,
+    )
 
-    with open(file_path, "r") as file:
-        for line in file:
-            if line.strip().startswith(target_line_start):
-                structure = line.split(target_line_start)[-1].strip()
-                return structure
 
-    return "Structure not found"
+def _search_cif_header(data, fields, record, start=0):
+    """Search a bytes buffer for the fields that are still missing from
+    the record, decoding only the matched values."""
+    for name in fields:
+        if name in record:
+            continue
+        pattern = CIF_HEADER_PATTERNS.get(name) or _get_cif_tag_pattern(name)
+        match = pattern.search(data, start)
+        if match is None:
+            continue
+        value = (match.group(1) or b"").decode("utf-8", "replace").strip()
+        if name == "Formula":
+            value = value.replace("'", "").replace(" ", "")
+        record[name] = value
+
+
+def parse_cif_header_bytes(data, fields=("Entry", "Formula", "Structure")):
+    """Extract header fields from the raw bytes of a CIF file.
+
+    Fields are either a key of ``CIF_HEADER_PATTERNS`` or a raw CIF tag
+    such as ``"_cell_volume"``, whose value is the rest of the line.
+
+    Returns:
+        dict: Requested field names mapped to their values. Fields that
+        are not found fall back to ``CIF_HEADER_DEFAULTS`` or None.
+    """
+    record = {}
+    _search_cif_header(data, fields, record)
+    return {
+        name: record.get(name, CIF_HEADER_DEFAULTS.get(name))
+        for name in fields
+    }
+
+
+def _search_cif_head(file, fields, record, header_bytes):
+    """Search the first ``header_bytes`` of a binary file and return the
+    head and the offset up to which it has been searched."""
+    head = file.read(header_bytes)
+    # Drop a line cut by the byte budget so it is searched whole later
+    end = len(head)
+    if end == header_bytes:
+        end = head.rfind(b"\n") + 1
+    _search_cif_header(head[:end], fields, record)
+    return head, end
+
+
+def read_cif_header(
+    file,
+    fields=("Entry", "Formula", "Structure"),
+    header_bytes=CIF_HEADER_BYTES,
+):
+    """Read header fields from a binary file object such as an archive
+    member, reading past the first ``header_bytes`` only when a field is
+    missing."""
+    record = {}
+    head, end = _search_cif_head(file, fields, record, header_bytes)
+    if len(record) < len(fields) and len(head) == header_bytes:
+        _search_cif_header(head[end:] + file.read(), fields, record)
+    return {
+        name: record.get(name, CIF_HEADER_DEFAULTS.get(name))
+        for name in fields
+    }
+
+
+def get_cif_header(
+    file_path,
+    fields=("Entry", "Formula", "Structure"),
+    header_bytes=CIF_HEADER_BYTES,
+):
+    """Read the entry ID, formula, structure type and any other
+    requested tags from a CIF file, opening it only once.
+
+    Only the first ``header_bytes`` are read; the rest of the file is
+    memory-mapped and searched without decoding when a field is missing
+    from the header.
+    """
+    record = {}
+    with open(file_path, "rb") as file:
+        _, end = _search_cif_head(file, fields, record, header_bytes)
+        size = os.fstat(file.fileno()).st_size
+        if len(record) < len(fields) and size > end:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                _search_cif_header(mm, fields, record, start=end)
+    return {
+        name: record.get(name, CIF_HEADER_DEFAULTS.get(name))
+        for name in fields
+    }
+
+
+def get_cif_structure(file_path):
+    """Extracts the CIF structure from a file."""
+    return get_cif_header(file_path, ("Structure",))["Structure"]
 
 
 def get_formula_from_cif(file_path):
     """Simply parse the formula from a CIF file Remove "'", empty space
     Order alphabetically."""
-
-    target_line_start = "_chemical_formula_sum"
-
-    with open(file_path, "r") as file:
-        for line in file:
-            if line.strip().startswith(target_line_start):
-                # Extract the formula part, assuming it's after the key
-                formula = (
-                    line.split(target_line_start)[-1].strip().replace("'", "")
-                )
-                formula = formula.replace(" ", "")
-
-                return formula
-    return "Formula not found"
+    return get_cif_header(file_path, ("Formula",))["Formula"]
 
 
 def get_cif_entry_id(cif_file_path: str) -> str:
-    database_code = None
-
-    with open(cif_file_path, "r") as file:
-        for line in file:
-            line = line.strip()
-            if line.startswith("#_database_code") or line.startswith(
-                "_database_code"
-            ):
-                # Split the line by whitespace to get the key and value
-                parts = line.split()
-                if len(parts) == 2:
-                    database_code = parts[1]
-                    break
-
-    return database_code
+    return get_cif_header(cif_file_path, ("Entry",))["Entry"]
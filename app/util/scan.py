@@ -0,0 +1,189 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from app.util import parser
+
+CIF_COLUMNS = ("Entry", "Formula", "Structure")
+
+
+def iter_cif_files(folder_path, recursive=True):
+    """Yield the .cif file paths in a folder in a deterministic order.
+
+    Directories and files are visited alphabetically so repeated scans
+    of the same folder always produce the same row order.
+    """
+    if not recursive:
+        for f in sorted(os.listdir(folder_path)):
+            if f.endswith(".cif"):
+                yield os.path.join(folder_path, f)
+        return
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(".cif"):
+                yield os.path.join(root, file)
+
+
+def list_cif_files(folder_path, recursive=True):
+    """Return the .cif file paths in a folder in a deterministic order."""
+    return list(iter_cif_files(folder_path, recursive=recursive))
+
+
+def _iter_batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _read_header(file_path, fields, capture_errors):
+    if not capture_errors:
+        return parser.get_cif_header(file_path, fields)
+    try:
+        record = parser.get_cif_header(file_path, fields)
+        record["Error"] = None
+    except (OSError, UnicodeDecodeError) as e:
+        record = {
+            name: parser.CIF_HEADER_DEFAULTS.get(name) for name in fields
+        }
+        record["Error"] = str(e)
+    return record
+
+
+def _read_header_chunk(file_paths, fields, capture_errors=False):
+    """Read the header records of a batch of CIF files."""
+    return [_read_header(path, fields, capture_errors) for path in file_paths]
+
+
+def iter_header_chunks(
+    file_paths,
+    fields=CIF_COLUMNS,
+    workers=1,
+    chunk_size=500,
+    capture_errors=False,
+):
+    """Lazily read CIF header records in batches of ``chunk_size``.
+
+    With more than one worker, at most two batches per worker are in
+    flight at once so memory stays bounded for any number of files.
+
+    Yields:
+        list[dict]: Header records of the next batch, in input order.
+    """
+    workers = workers or os.cpu_count() or 1
+    batches = _iter_batches(file_paths, chunk_size)
+    if workers == 1:
+        for batch in batches:
+            yield _read_header_chunk(batch, fields, capture_errors)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(
+                executor.submit(
+                    _read_header_chunk, batch, fields, capture_errors
+                )
+            )
+            # Results are consumed in submission order, keeping rows stable
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_cif_headers(
+    file_paths,
+    fields=CIF_COLUMNS,
+    workers=1,
+    chunk_size=500,
+    capture_errors=False,
+):
+    """Read the header records of many CIF files, optionally spread over
+    a process pool.
+
+    Args:
+        file_paths (list[str]): CIF files to read.
+        fields (tuple[str]): Header fields passed to get_cif_header.
+        workers (int | None): Number of worker processes. 1 reads in the
+            current process, None uses every available CPU.
+        chunk_size (int): Number of files handed to a worker at once.
+        capture_errors (bool): Store read errors under an "Error" key
+            instead of raising them.
+
+    Returns:
+        list[dict]: One header record per file, in the input order.
+    """
+    if len(file_paths) <= chunk_size:
+        workers = 1
+    records = []
+    for chunk_records in iter_header_chunks(
+        file_paths, fields, workers, chunk_size, capture_errors
+    ):
+        records.extend(chunk_records)
+    return records
+
+
+def iter_cif_records(
+    folder_path, chunk_size=500, recursive=True, workers=1, as_frame=True
+):
+    """Stream the Entry/Formula/Structure records of a CIF folder.
+
+    Files are listed and parsed lazily, so downstream steps can process
+    each chunk before the next one is read.
+
+    Yields:
+        pd.DataFrame | list[dict]: The next ``chunk_size`` records, as a
+        DataFrame unless ``as_frame`` is False.
+    """
+    file_paths = iter_cif_files(folder_path, recursive=recursive)
+    for records in iter_header_chunks(
+        file_paths, CIF_COLUMNS, workers=workers, chunk_size=chunk_size
+    ):
+        if as_frame:
+            yield pd.DataFrame(records, columns=list(CIF_COLUMNS))
+        else:
+            yield records
+
+
+def scan_cif_folder(folder_path, recursive=True, workers=1, chunk_size=500):
+    """Parse every CIF file in a folder into an Entry/Formula/Structure
+    DataFrame."""
+    chunks = list(
+        iter_cif_records(
+            folder_path,
+            chunk_size=chunk_size,
+            recursive=recursive,
+            workers=workers,
+        )
+    )
+    if not chunks:
+        return pd.DataFrame(columns=list(CIF_COLUMNS))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_cif_records_csv(
+    folder_path, csv_path, chunk_size=500, recursive=True, workers=1
+):
+    """Stream the records of a CIF folder into a CSV file chunk by chunk
+    and return the number of rows written."""
+    num_rows = 0
+    with open(csv_path, "w", newline="") as file:
+        for chunk in iter_cif_records(
+            folder_path,
+            chunk_size=chunk_size,
+            recursive=recursive,
+            workers=workers,
+        ):
+            chunk.to_csv(file, header=num_rows == 0, index=False)
+            num_rows += len(chunk)
+        if num_rows == 0:
+            file.write(",".join(CIF_COLUMNS) + "\n")
+    return num_rows
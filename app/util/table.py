@@ -0,0 +1,150 @@
+import importlib.util
+import os
+
+import pandas as pd
+
+from app.options import ARROW_FORMATS, TABLE_FORMATS
+from app.util import header, table_cache
+
+TABLE_EXTENSIONS = tuple(TABLE_FORMATS.values())
+
+PARQUET_COMPRESSION = "zstd"
+
+# Output format of the session, None keeps each runner's own default
+_output_format = None
+
+
+def set_output_format(name):
+    """Select the format of every table written in this session, or
+    None to go back to the default of each runner."""
+    global _output_format
+    if name is not None and name not in TABLE_FORMATS:
+        raise ValueError(
+            f"Unknown output format {name!r}, choose one of "
+            f"{', '.join(TABLE_FORMATS)}."
+        )
+    if name in ARROW_FORMATS and not has_pyarrow():
+        raise ValueError(f"The {name} format needs pyarrow installed.")
+    _output_format = name
+
+
+def has_pyarrow():
+    """Return whether pyarrow can be imported, without importing it."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def get_output_format():
+    """Return the output format of the session, None if not selected."""
+    return _output_format
+
+
+def output_filename(stem, default=".xlsx"):
+    """Return the file name of an output table, ``stem`` followed by the
+    extension of the session format or ``default``."""
+    if _output_format is None:
+        return stem + default
+    return stem + TABLE_FORMATS[_output_format]
+
+
+def get_extension(file_path):
+    return os.path.splitext(file_path)[1].lower()
+
+
+def is_table_file(file_path):
+    """Return whether the file has the extension of a table format."""
+    return get_extension(file_path) in TABLE_EXTENSIONS
+
+
+def is_workbook(file_path):
+    """Return whether the file is an Excel workbook with sheets."""
+    return get_extension(file_path) == ".xlsx"
+
+
+def _to_arrow_compatible(df):
+    """Return a copy Arrow can store: duplicated column names get a
+    ``.1``, ``.2`` suffix like pandas gives them on read, and object
+    columns Arrow cannot convert, e.g. one mixing numbers and strings,
+    are stored as strings."""
+    import pyarrow as pa
+
+    columns, seen = [], {}
+    for column in df.columns:
+        column = str(column)
+        if column in seen:
+            seen[column] += 1
+            column = f"{column}.{seen[column]}"
+        else:
+            seen[column] = 0
+        columns.append(column)
+    df = df.reset_index(drop=True).set_axis(columns, axis=1)
+    for i, dtype in enumerate(df.dtypes):
+        if dtype != object:
+            continue
+        values = df.iloc[:, i]
+        try:
+            pa.array(values, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df.isetitem(i, values.where(values.isna(), values.astype(str)))
+    return df
+
+
+def write_table(df, file_path):
+    """Write a DataFrame without its index in the format given by the
+    extension of ``file_path``."""
+    ext = get_extension(file_path)
+    if ext == ".xlsx":
+        df.to_excel(file_path, index=False)
+    elif ext == ".csv":
+        df.to_csv(file_path, index=False)
+    elif ext == ".parquet":
+        _to_arrow_compatible(df).to_parquet(
+            file_path, index=False, compression=PARQUET_COMPRESSION
+        )
+    elif ext == ".feather":
+        _to_arrow_compatible(df).to_feather(file_path)
+    else:
+        raise ValueError(f"Unsupported table format: {file_path}")
+    return file_path
+
+
+def read_table(file_path, sheet_name=None, usecols=None, use_cache=True):
+    """Read a table file of any supported format.
+
+    ``sheet_name`` only applies to workbooks, where None reads the
+    first sheet. With ``use_cache``, workbook sheets are read through
+    their Parquet sidecar, see table_cache.read_excel_cached.
+    """
+    ext = get_extension(file_path)
+    if ext == ".xlsx":
+        sheet_name = 0 if sheet_name is None else sheet_name
+        if use_cache:
+            return table_cache.read_excel_cached(
+                file_path, sheet_name, usecols
+            )
+        return pd.read_excel(file_path, sheet_name=sheet_name, usecols=usecols)
+    if ext == ".csv":
+        return pd.read_csv(file_path, usecols=usecols)
+    if ext == ".parquet":
+        return pd.read_parquet(file_path, columns=usecols)
+    if ext == ".feather":
+        return pd.read_feather(file_path, columns=usecols)
+    raise ValueError(f"Unsupported table format: {file_path}")
+
+
+def get_columns(file_path, sheet_name=None):
+    """Return the column names of a table without reading its rows."""
+    ext = get_extension(file_path)
+    if ext == ".xlsx":
+        return header.get_columns(file_path, sheet_name)
+    if ext == ".csv":
+        return list(pd.read_csv(file_path, nrows=0).columns)
+    if ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(file_path).names
+    if ext == ".feather":
+        import pyarrow as pa
+
+        with pa.memory_map(file_path) as source:
+            return pa.ipc.open_file(source).schema.names
+    raise ValueError(f"Unsupported table format: {file_path}")
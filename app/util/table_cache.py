@@ -0,0 +1,207 @@
+import datetime
+import hashlib
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+CACHE_DIRNAME = ".table_cache"
+
+# Sidecars of a folder are evicted, least recently read first, once
+# they take more than this many bytes
+MAX_CACHE_BYTES = 2 * 1024**3
+
+# Mixed object columns are stored as text next to a column holding the
+# Python type of every cell, so they are read back exactly as before
+TYPE_COLUMN_PREFIX = "\0type "
+_CELL_TYPES = (
+    (str, str),
+    (int, int),
+    (float, float),
+    (bool, lambda text: text == "True"),
+    (datetime.datetime, datetime.datetime.fromisoformat),
+    (datetime.time, datetime.time.fromisoformat),
+    (type(None), lambda text: None),
+)
+_TYPE_CODES = {
+    cell_type: code for code, (cell_type, _) in enumerate(_CELL_TYPES)
+}
+
+
+def get_cache_dir(directory):
+    """Return the sidecar cache folder of a directory of workbooks."""
+    return os.path.join(directory, CACHE_DIRNAME)
+
+
+def _digest(*parts):
+    text = "\0".join(str(part) for part in parts)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def _encode_mixed(df):
+    """Return the sheet with every object column Arrow cannot convert
+    encoded as text and type codes, or None if a cell has a type that
+    cannot be restored."""
+    import pyarrow as pa
+
+    if not all(isinstance(column, str) for column in df.columns):
+        return None
+    encoded = {}
+    for column in df.columns[df.dtypes == object]:
+        values = df[column]
+        try:
+            pa.array(values, from_pandas=True)
+            continue
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+        codes = values.map(type).map(_TYPE_CODES)
+        if codes.isna().any():
+            return None
+        encoded[column] = [
+            value.isoformat() if hasattr(value, "isoformat") else str(value)
+            for value in values
+        ]
+        encoded[TYPE_COLUMN_PREFIX + column] = codes.astype("int8")
+    return df.assign(**encoded) if encoded else df
+
+
+def _decode_mixed(df):
+    """Restore the mixed object columns written by _encode_mixed."""
+    type_columns = [
+        column
+        for column in df.columns
+        if column.startswith(TYPE_COLUMN_PREFIX)
+    ]
+    for type_column in type_columns:
+        column = type_column[len(TYPE_COLUMN_PREFIX) :]
+        decoders = [_CELL_TYPES[code][1] for code in df[type_column]]
+        df[column] = pd.Series(
+            [decode(text) for decode, text in zip(decoders, df[column])],
+            index=df.index,
+            dtype=object,
+        )
+    return df.drop(columns=type_columns)
+
+
+def evict(directory, max_bytes=MAX_CACHE_BYTES):
+    """Delete the least recently read sidecars of a directory until the
+    cache takes at most ``max_bytes``."""
+    cache_dir = get_cache_dir(directory)
+    try:
+        entries = [
+            (entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+            for entry in os.scandir(cache_dir)
+            if entry.name.endswith(".parquet")
+        ]
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def read_excel_cached(
+    file_path, sheet_name=0, usecols=None, max_bytes=MAX_CACHE_BYTES
+):
+    """Read a workbook sheet through its Parquet sidecar.
+
+    The first read of a sheet parses the workbook and stores the whole
+    sheet in ``.table_cache`` next to it. Later reads load the sidecar
+    until the workbook's size or mtime changes. Sheets Parquet cannot
+    store as read, and folders that are not writable, are read from
+    the workbook every time, as is every sheet when pyarrow is not
+    installed.
+    """
+    file_path = os.path.abspath(file_path)
+    directory, name = os.path.split(file_path)
+    stat = os.stat(file_path)
+    prefix = _digest(name, sheet_name)
+    sidecar = os.path.join(
+        get_cache_dir(directory),
+        f"{prefix}-{_digest(stat.st_size, stat.st_mtime_ns)}.parquet",
+    )
+    columns = None if usecols is None else list(usecols)
+    try:
+        df = _read_sidecar(sidecar, columns)
+        # Mark the sidecar as recently read for eviction
+        os.utime(sidecar)
+        return df
+    except ImportError:
+        # Sidecars need pyarrow, read the workbook without one
+        return pd.read_excel(file_path, sheet_name=sheet_name, usecols=usecols)
+    except (OSError, ValueError):
+        pass
+
+    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    try:
+        encoded = _encode_mixed(df)
+    except ImportError:
+        encoded = None
+    if encoded is not None:
+        _write_sidecar(encoded, sidecar, prefix, max_bytes)
+    return df if usecols is None else df[columns]
+
+
+def _read_sidecar(sidecar, columns=None):
+    if columns is not None:
+        import pyarrow.parquet as pq
+
+        names = pq.read_schema(sidecar).names
+        columns = columns + [
+            TYPE_COLUMN_PREFIX + column
+            for column in columns
+            if TYPE_COLUMN_PREFIX + column in names
+        ]
+    return _decode_mixed(pd.read_parquet(sidecar, columns=columns))
+
+
+def _write_sidecar(df, sidecar, prefix, max_bytes):
+    cache_dir = os.path.dirname(sidecar)
+    temp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Drop the sidecars of older versions of the same sheet, which
+        # another process may be dropping at the same time
+        for entry in os.scandir(cache_dir):
+            if entry.name.startswith(prefix + "-"):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        # A temporary file of its own lets processes reading the same
+        # sheet write its sidecar at the same time
+        with tempfile.NamedTemporaryFile(
+            dir=cache_dir, suffix=".tmp", delete=False
+        ) as file:
+            temp_path = file.name
+        df.to_parquet(temp_path, index=False)
+        os.replace(temp_path, sidecar)
+    except OSError:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+    evict(os.path.dirname(cache_dir), max_bytes)
+
+
+def get_cache_size(directory):
+    """Return the number of bytes taken by the sidecars of a
+    directory."""
+    try:
+        return sum(
+            entry.stat().st_size
+            for entry in os.scandir(get_cache_dir(directory))
+        )
+    except OSError:
+        return 0
+
+
+def clear_table_cache(directory):
+    """Delete the sidecar cache of a directory if it exists."""
+    shutil.rmtree(get_cache_dir(directory), ignore_errors=True)
@@ -0,0 +1,107 @@
+import os
+
+from app.util import archive
+
+
+class Workspace:
+    """Inventory of the files and CIF folders in a directory.
+
+    The listing is built with a single os.scandir call and reused by
+    every menu. It is rebuilt only when the directory's mtime changes,
+    e.g. after an option saved a new file. Extension lookups and file
+    counts of subdirectories are cached the same way.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime_ns = None
+        self._files = []
+        self._dirs = []
+        self._dir_cache = {}
+
+    def _refresh(self):
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return
+        files, dirs = [], []
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    dirs.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+        self._files = sorted(files)
+        self._dirs = sorted(dirs)
+        self._mtime_ns = mtime_ns
+
+    @property
+    def files(self):
+        """Sorted names of the files in the directory."""
+        self._refresh()
+        return list(self._files)
+
+    @property
+    def dirs(self):
+        """Sorted names of the subdirectories."""
+        self._refresh()
+        return list(self._dirs)
+
+    def files_with_ext(self, *exts):
+        """Return the sorted file names ending with any of the
+        extensions."""
+        return [f for f in self.files if f.endswith(exts)]
+
+    def _scan_dir(self, dir_name, ext, count):
+        """Return (has_file, file_count or None) for a subdirectory,
+        stopping at the first match unless a count is needed."""
+        dir_path = os.path.join(self.path, dir_name)
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+        cached = self._dir_cache.get((dir_name, ext))
+        if (
+            cached
+            and cached[0] == mtime_ns
+            and (cached[2] is not None or not count)
+        ):
+            return cached[1], cached[2]
+
+        has_file, num_files = False, 0
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.name.endswith(ext) and entry.is_file():
+                    has_file = True
+                    num_files += 1
+                    if not count:
+                        break
+        num_files = num_files if count else None
+        self._dir_cache[(dir_name, ext)] = (mtime_ns, has_file, num_files)
+        return has_file, num_files
+
+    def dir_has_ext(self, dir_name, ext=".cif"):
+        """Return True if the subdirectory contains a file ending with
+        the extension."""
+        return self._scan_dir(dir_name, ext, count=False)[0]
+
+    def dir_count_ext(self, dir_name, ext=".cif"):
+        """Return the number of files ending with the extension in the
+        subdirectory."""
+        return self._scan_dir(dir_name, ext, count=True)[1]
+
+    def dirs_with_ext(self, ext=".cif"):
+        """Return the sorted subdirectories containing files ending with
+        the extension."""
+        return [d for d in self.dirs if self.dir_has_ext(d, ext)]
+
+    def cif_archives(self):
+        """Return the sorted zip/tar archive file names."""
+        return [f for f in self.files if archive.is_archive_name(f)]
+
+
+_workspaces = {}
+
+
+def get_workspace(path):
+    """Return the session-wide inventory of a directory."""
+    path = os.path.abspath(path)
+    if path not in _workspaces:
+        _workspaces[path] = Workspace(path)
+    return _workspaces[path]
@@ -0,0 +1,99 @@
+"""Benchmark the formula parsers of the filter option.
+
+Usage:
+    python -m benchmarks.formula_parser [excel_file] [--repeat N]
+
+Formulas are read from the "Formula" column of the Excel file, or
+generated when no file is given. The shared formula cache is bypassed so
+every call parses its formula.
+"""
+
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from app.filter_util import parser
+from app.filter_util.data import get_element_list
+from app.util import header
+from app.util.formula_cache import get_formula_cache
+
+SAMPLE_SIZE = 20000
+
+
+def generate_formulas(size, seed=0):
+    """Return random binary to quaternary formulas with integer and
+    decimal counts."""
+    rng = random.Random(seed)
+    symbols = get_element_list()
+    formulas = []
+    for _ in range(size):
+        elements = rng.sample(symbols, rng.randint(2, 4))
+        counts = [
+            rng.choice(["", str(rng.randint(2, 12)), f"{rng.random():.2f}"])
+            for _ in elements
+        ]
+        formulas.append("".join(e + c for e, c in zip(elements, counts)))
+    return formulas
+
+
+def read_formulas(file_path):
+    column = header.find_column(header.get_columns(file_path), "Formula")
+    if column is None:
+        raise SystemExit(f"No Formula column in {file_path}")
+    df = pd.read_excel(file_path, usecols=[column])
+    return df[column].dropna().astype(str).tolist()
+
+
+def time_per_formula(parse, formulas, repeat):
+    """Return the best formulas/sec of calling ``parse`` on each
+    formula."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for formula in formulas:
+            parse(formula)
+        best = min(best, time.perf_counter() - start)
+    return len(formulas) / best
+
+
+def time_column(formulas, repeat, tokenize=False):
+    """Return the best formulas/sec of parse_formula_column."""
+    best = float("inf")
+    for _ in range(repeat):
+        get_formula_cache().clear()
+        start = time.perf_counter()
+        parser.parse_formula_column(formulas, tokenize=tokenize)
+        best = min(best, time.perf_counter() - start)
+    return len(formulas) / best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    arg_parser.add_argument("excel_file", nargs="?")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    if args.excel_file:
+        formulas = read_formulas(args.excel_file)
+    else:
+        formulas = generate_formulas(SAMPLE_SIZE)
+    print(f"{len(formulas)} formulas, best of {args.repeat}")
+
+    parsers = {
+        "parse_formula1": parser.parse_formula1,
+        "parse_formula2": parser.parse_formula2,
+        "tokenize_formula": parser.tokenize_formula.__wrapped__,
+    }
+    for name, parse in parsers.items():
+        rate = time_per_formula(parse, formulas, args.repeat)
+        print(f"{name:<32}{rate:>14,.0f} formulas/sec")
+    for tokenize in (False, True):
+        rate = time_column(formulas, args.repeat, tokenize)
+        name = "parse_formula_column" + (" +tokenize" if tokenize else "")
+        print(f"{name:<32}{rate:>14,.0f} formulas/sec")
+
+
+if __name__ == "__main__":
+    main()
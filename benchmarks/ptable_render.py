@@ -0,0 +1,144 @@
+"""Benchmark the periodic table heatmap of the filter option.
+
+Usage:
+    python -m benchmarks.ptable_render [--dpi 100 500] [--repeat N]
+
+Compares the collection renderer of app.filter_util.prevalence with
+the previous one, which added every cell as its own Rectangle patch.
+Each renderer runs in a fresh process so its peak resident memory can
+be reported.
+"""
+
+import argparse
+import io
+import multiprocessing
+import random
+import resource
+import sys
+import time
+
+SKIPPED = {"Fr", "Ra", "Rf", "Db", "Sg", "Bh", "Hs", "Mt", "Ds"}
+SKIPPED |= {"Rg", "Cn", "Nh", "Fl", "Mc", "Lv", "Ts", "Og"}
+
+
+def get_values(seed=0):
+    """Return random element counts, about a third of them zero."""
+    from app.filter_util.data import get_element_list
+
+    rng = random.Random(seed)
+    return {
+        symbol: rng.choice([0, rng.randint(1, 600)])
+        for symbol in get_element_list()
+        if symbol not in SKIPPED
+    }
+
+
+def make_patch_heatmap(values):
+    """The previous renderer: one Rectangle patch per cell border and
+    per element, added one by one."""
+    import matplotlib.patches as patches
+    import matplotlib.pyplot as plt
+    from matplotlib import colormaps
+    from matplotlib.colors import Normalize
+
+    from app.filter_util import prevalence
+    from data.table_coordinates import get_classic_coordinates
+
+    coords = get_classic_coordinates()
+    fig, ax = prevalence.make_table_fig()
+    # Drop the border collection, the patches below replace it
+    ax.collections[0].remove()
+    for x, y in coords.values():
+        ax.add_patch(
+            patches.Rectangle(
+                (x - 0.5, y - 0.5),
+                1,
+                1,
+                edgecolor="black",
+                linewidth=1.3,
+                facecolor="none",
+            )
+        )
+    cmap = colormaps["GnBu"]
+    norm = Normalize(vmin=min(values.values()), vmax=max(values.values()))
+    for symbol, val in values.items():
+        x, y = coords[symbol]
+        facecolor = cmap(norm(val)) if val else "none"
+        ax.add_patch(
+            patches.Rectangle(
+                (x - 0.5, y - 0.5),
+                1,
+                1,
+                facecolor=facecolor,
+                edgecolor="none",
+                zorder=0,
+            )
+        )
+        ax.text(x, y, symbol, ha="center", va="center", fontsize=25)
+    plt.colorbar(
+        ax.imshow([[0, 1]], cmap="GnBu", visible=False),
+        cax=ax.inset_axes((0.19, 0.77, 0.4, 0.02)),
+        orientation="horizontal",
+    )
+    return fig
+
+
+def make_collection_heatmap(values):
+    from app.filter_util import prevalence
+
+    fig, ax = prevalence.make_table_fig()
+    prevalence.make_heatmap(ax, values)
+    return fig
+
+
+RENDERERS = {
+    "patches": make_patch_heatmap,
+    "collection": make_collection_heatmap,
+}
+
+
+def run_renderer(name, dpi, repeat, queue):
+    """Render and save to memory ``repeat`` times, then report the best
+    time and the peak resident memory of the process."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    values = get_values()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig = RENDERERS[name](values)
+        fig.savefig(io.BytesIO(), format="png", bbox_inches="tight", dpi=dpi)
+        best = min(best, time.perf_counter() - start)
+        plt.close(fig)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak *= 1024
+    queue.put((best, peak))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    arg_parser.add_argument("--dpi", type=int, nargs="+", default=[100, 500])
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"best of {args.repeat}")
+    print(f"{'renderer':<12}{'dpi':>6}{'seconds':>10}{'peak MB':>10}")
+    for dpi in args.dpi:
+        for name in RENDERERS:
+            queue = context.Queue()
+            process = context.Process(
+                target=run_renderer, args=(name, dpi, args.repeat, queue)
+            )
+            process.start()
+            seconds, peak = queue.get()
+            process.join()
+            print(f"{name:<12}{dpi:>6}{seconds:>10.3f}{peak / 1e6:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
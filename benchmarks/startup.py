@@ -0,0 +1,95 @@
+"""Benchmark the startup of main.py up to its option menu.
+
+Usage:
+    python -m benchmarks.startup [--repeat N] [--budget-ms MS]
+
+Reports the import time of main from ``python -X importtime`` with its
+slowest imports, then the wall time from launching main.py until the
+option prompt is printed. Exits with status 1 when the median
+time-to-menu exceeds the budget.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MENU_PROMPT = b"Please enter the number of the option"
+DEFAULT_BUDGET_MS = 500
+
+
+def get_import_times(module="main"):
+    """Return (cumulative microseconds, name) of every import done by
+    ``import module`` in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR,
+        capture_output=True,
+        check=True,
+    )
+    times = []
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times.append((int(cumulative), name.strip()))
+    return times
+
+
+def time_to_menu():
+    """Return the seconds from launching main.py until it prompts for
+    an option."""
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=REPO_DIR,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=env,
+    )
+    output = b""
+    try:
+        while MENU_PROMPT not in output:
+            chunk = os.read(process.stdout.fileno(), 4096)
+            if not chunk:
+                raise RuntimeError("main.py exited before the menu")
+            output += chunk
+        return time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument(
+        "--budget-ms", type=float, default=DEFAULT_BUDGET_MS
+    )
+    arg_parser.add_argument("--top", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    times = get_import_times()
+    total = next(us for us, name in times if name == "main")
+    print(f"import main: {total / 1000:.1f} ms, slowest imports:")
+    for us, name in sorted(times, reverse=True)[: args.top]:
+        print(f"  {us / 1000:>8.1f} ms  {name}")
+
+    runs = [time_to_menu() * 1000 for _ in range(args.repeat)]
+    median = statistics.median(runs)
+    print(
+        f"time to menu: median {median:.0f} ms, best {min(runs):.0f} ms "
+        f"of {args.repeat}, budget {args.budget_ms:.0f} ms"
+    )
+    if median > args.budget_ms:
+        print("over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
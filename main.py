@@ -1,28 +1,38 @@
+import importlib
+import importlib.util
 import os
 
 import click
 
-from app.runners import feature, filter, match, merge, sort
+from app.options import (
+    ARROW_FORMATS,
+    SORT_METHODS,
+    SPLIT_METHODS,
+    TABLE_FORMATS,
+)
+
+# Runner of every option. Runners pull in pandas, matplotlib, CAF and
+# bobleesj, so they are imported only once their option is chosen
+OPTION_RUNNERS = {
+    1: ("app.runners.filter", "run_filter_option"),
+    2: ("app.runners.sort", "run_sort_option"),
+    3: ("app.runners.feature", "run_feature_option"),
+    4: ("app.runners.match", "run_match_option"),
+    5: ("app.runners.merge", "run_merge_option"),
+}
 
 
 # Function to run the selected option
 def run_selected_option(option, script_dir_path):
-    if option == 1:
-        filter.run_filter_option(script_dir_path)
-    elif option == 2:
-        sort.run_sort_option(script_dir_path)
-    elif option == 3:
-        feature.run_feature_option(script_dir_path)
-    elif option == 4:
-        match.run_match_option(script_dir_path)
-    elif option == 5:
-        merge.run_merge_option(script_dir_path)
-    else:
+    if option not in OPTION_RUNNERS:
         click.echo("Invalid option. Please choose 1, 2, 3, 4, or 5.")
+        return
+    module_name, function_name = OPTION_RUNNERS[option]
+    runner = getattr(importlib.import_module(module_name), function_name)
+    runner(script_dir_path)
 
 
-@click.command()
-def main():
+def choose_option():
     # Display options
     click.echo("\nOptions:")
     click.echo(
@@ -48,9 +58,274 @@ def main():
             "Please enter the number of the option you want to run",
             type=int,
         )
+    return option
+
+
+def check_output_format(ctx, param, value):
+    """Reject the formats needing pyarrow before anything runs when
+    pyarrow is not installed."""
+    if value in ARROW_FORMATS and importlib.util.find_spec("pyarrow") is None:
+        raise click.BadParameter(
+            f"the {value} format needs pyarrow installed."
+        )
+    return value
+
+
+def run_job(command, **kwargs):
+    """Run one option without prompting, see app.runners.batch.run_job."""
+    from app.runners import batch
+    from app.util import table
+
+    try:
+        batch.run_job(
+            {"command": command, **kwargs}, table.get_output_format()
+        )
+    except (ValueError, KeyError, RuntimeError, OSError, ImportError) as error:
+        raise click.ClickException(f"{type(error).__name__}: {error}")
+
+
+@click.group(invoke_without_command=True)
+@click.option(
+    "--output-format",
+    type=click.Choice(list(TABLE_FORMATS)),
+    default=None,
+    callback=check_output_format,
+    help="Format of every table saved in this session. Parquet and "
+    "Feather are much faster than xlsx for large sheets. Defaults to "
+    "xlsx, or csv where an option already saved csv.",
+)
+@click.option(
+    "--clear-cache",
+    is_flag=True,
+    help="Delete the Parquet read cache of the workbooks in this folder "
+    "before running.",
+)
+@click.pass_context
+def main(ctx, output_format, clear_cache):
+    """Run an option chosen from a menu, or one of the commands below
+    without prompting."""
+    if ctx.invoked_subcommand is None:
+        option = choose_option()
 
     script_dir_path = os.path.dirname(os.path.abspath(__file__))
-    run_selected_option(option, script_dir_path)
+    from app.util import table, table_cache
+
+    table.set_output_format(output_format)
+    if clear_cache:
+        table_cache.clear_table_cache(script_dir_path)
+    if ctx.invoked_subcommand is None:
+        run_selected_option(option, script_dir_path)
+
+
+@main.command("filter")
+@click.argument("input_path", type=click.Path(exists=True))
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    help="Folder of the outputs, by default the folder of the input.",
+)
+@click.option(
+    "--parsed",
+    is_flag=True,
+    help="Summarize the input table as an already parsed sheet.",
+)
+@click.option(
+    "--split",
+    type=click.Choice(SPLIT_METHODS),
+    default=None,
+    help="Split the filtered entries by System or by --exclude elements.",
+)
+@click.option(
+    "--exclude",
+    default="",
+    help="Comma-separated elements to split out, e.g. Fe,Ni.",
+)
+@click.option(
+    "--heatmaps-by",
+    multiple=True,
+    help="Column to save one heatmap per value of, e.g. System.",
+)
+@click.option(
+    "--workbook",
+    is_flag=True,
+    help="Save the tables as the sheets of one workbook.",
+)
+@click.option(
+    "--checkpoint",
+    is_flag=True,
+    help="Write each output as soon as it is ready.",
+)
+@click.option(
+    "--tokenize",
+    is_flag=True,
+    help="Read groups, hydrates and fractions in formulas, summing "
+    "repeated elements.",
+)
+def filter_command(
+    input_path,
+    output_dir,
+    parsed,
+    split,
+    exclude,
+    heatmaps_by,
+    workbook,
+    checkpoint,
+    tokenize,
+):
+    """Filter the formulas of a CIF folder, archive or table."""
+    exclude = [elem.strip() for elem in exclude.split(",") if elem.strip()]
+    if exclude and split == "system":
+        raise click.UsageError("--exclude only applies to --split elements.")
+    run_job(
+        "filter",
+        input_path=input_path,
+        output_dir=output_dir,
+        parse=not parsed,
+        split=split or ("elements" if exclude else None),
+        exclude=exclude,
+        heatmaps_by=heatmaps_by,
+        workbook=workbook,
+        checkpoint=checkpoint,
+        tokenize=tokenize,
+    )
+
+
+@main.command("sort")
+@click.argument("file_path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--method",
+    type=click.Choice(SORT_METHODS),
+    required=True,
+    help="Sort by custom label, stoichiometry or elemental property.",
+)
+@click.option(
+    "--property",
+    "property_name",
+    help="Property of --method property, e.g. MEND_NUM.",
+)
+@click.option(
+    "--ascending/--descending",
+    default=True,
+    help="Order of the indices, ascending by default.",
+)
+@click.option(
+    "--normalize",
+    is_flag=True,
+    help="Convert the indices into fractions.",
+)
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    help="Folder of the output, by default the folder of the input.",
+)
+def sort_command(
+    file_path, method, property_name, ascending, normalize, output_dir
+):
+    """Sort the formulas of a table."""
+    run_job(
+        "sort",
+        file_path=file_path,
+        method=method,
+        property_name=property_name,
+        ascending=ascending,
+        normalize=normalize,
+        output_dir=output_dir,
+    )
+
+
+@main.command("feature")
+@click.argument("file_path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--extended",
+    is_flag=True,
+    help="Also save the features with mathematical operations.",
+)
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    help="Folder of the feature files, by default the folder of the input.",
+)
+def feature_command(file_path, extended, output_dir):
+    """Create the compositional features of the formulas of a table."""
+    run_job(
+        "feature",
+        file_path=file_path,
+        extended_features=extended,
+        output_dir=output_dir,
+    )
+
+
+@main.command("match")
+@click.argument("cif_dir_path", type=click.Path(exists=True))
+@click.argument("table_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--sheet", help="Sheet of the workbook, by default the first.")
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    help="Folder of the report, by default the folder of the table.",
+)
+def match_command(cif_dir_path, table_path, sheet, output_dir):
+    """Match CIF files against the Entry column of a table."""
+    run_job(
+        "match",
+        cif_dir_path=cif_dir_path,
+        table_path=table_path,
+        sheet_name=sheet,
+        output_dir=output_dir,
+    )
+
+
+@main.command("merge")
+@click.argument(
+    "featurized_path", type=click.Path(exists=True, dir_okay=False)
+)
+@click.argument("database_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--featurized-sheet", help="Sheet of the featurized table.")
+@click.option("--database-sheet", help="Sheet of the database table.")
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    help="Folder of the merged table, by default the working folder.",
+)
+def merge_command(
+    featurized_path,
+    database_path,
+    featurized_sheet,
+    database_sheet,
+    output_dir,
+):
+    """Merge two tables on their Entry column."""
+    run_job(
+        "merge",
+        featurized_file_path=featurized_path,
+        database_file_path=database_path,
+        featurized_sheet_name=featurized_sheet,
+        database_sheet_name=database_sheet,
+        output_dir=output_dir,
+    )
+
+
+@main.command("batch")
+@click.argument("manifest_path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=os.cpu_count(),
+    show_default=True,
+    help="Number of jobs run at once, each in its own process.",
+)
+def batch_command(manifest_path, workers):
+    """Run the jobs of a JSON manifest, see app.runners.batch."""
+    from app.runners import batch
+    from app.util import table
+
+    try:
+        jobs, output_format = batch.load_manifest(manifest_path)
+    except (OSError, ValueError) as error:
+        raise click.ClickException(str(error))
+    output_format = output_format or table.get_output_format()
+    if batch.run_jobs(jobs, workers=workers, output_format=output_format):
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":